@@ -3,7 +3,6 @@
 from odoo import http
 
 from ..services.supplier_portal_base import SupplierPortalBaseService
-from ..services.supplier_portal_documents import SupplierPortalDocumentsService
 from ..services.supplier_portal_proforma import SupplierPortalProformaService
 
 
@@ -12,8 +11,8 @@ class SupplierPortalController(http.Controller):
     def __init__(self):
         super().__init__()
         self.base_service = SupplierPortalBaseService()
-        self.documents_service = SupplierPortalDocumentsService()
         self.proforma_service = SupplierPortalProformaService()
+        self.documents_service = self.proforma_service.documents_service
 
     # =====================================================================
     #  VIEW
@@ -112,6 +111,18 @@ class SupplierPortalController(http.Controller):
             params.get("rows"),
         )
 
+    @http.route("/supplier/api/v2/save_packing_delta", type="jsonrpc", auth="public", csrf=False)
+    def api_save_packing_delta(self, **kw):
+        params = self.base_service.get_params()
+        return self.proforma_service.save_packing_delta(
+            params.get("token"),
+            params.get("packing_id"),
+            params.get("revision"),
+            params.get("inserted"),
+            params.get("updated"),
+            params.get("deleted"),
+        )
+
     @http.route("/supplier/api/v2/delete_packing", type="jsonrpc", auth="public", csrf=False)
     def api_delete_packing(self, **kw):
         params = self.base_service.get_params()
@@ -186,6 +197,7 @@ class SupplierPortalController(http.Controller):
         params = self.base_service.get_params()
         return self.proforma_service.reload_proforma(
             params.get("token"),
+            revision=params.get("revision"),
         )
 
     # =====================================================================
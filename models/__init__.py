@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 from . import som_date_format
+from . import pl_template
+from . import spreadsheet_rows
+from . import vucem_pdf
+from . import documents_document
 from . import stock_picking
 from . import purchase_order
 from . import supplier_access
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+
+from odoo import fields, models
+
+_logger = logging.getLogger(__name__)
+
+
+class DocumentsDocument(models.Model):
+    _inherit = 'documents.document'
+
+    # Estado materializado de las hojas (base + revisiones ya aplicadas), un
+    # campo por lector. Permite que cada lectura reproduzca SOLO las
+    # revisiones nuevas en lugar de re-parsear el snapshot y re-aplicar todo
+    # el historial en cada llamada. Cada valor es una línea de cabecera
+    # (``base rev_id rev_count``) seguida del estado en JSON: la vigencia se
+    # comprueba sin parsear el estado.
+    som_picking_state_cache = fields.Text(
+        string='Estado de celdas del picking (caché)',
+        copy=False,
+        prefetch=False,
+    )
+    som_pl_sheets_state_cache = fields.Text(
+        string='Estado de hojas del PL (caché)',
+        copy=False,
+        prefetch=False,
+    )
+
+    _SOM_STATE_CACHE_FIELDS = {
+        'picking': 'som_picking_state_cache',
+        'pl_sheets': 'som_pl_sheets_state_cache',
+    }
+
+    def _som_spreadsheet_revisions(self, after_id=0):
+        """Revisiones del spreadsheet (incluye archivadas) en orden de
+        aplicación; con ``after_id`` solo las posteriores a esa revisión."""
+        self.ensure_one()
+        domain = [
+            ('res_model', '=', 'documents.document'),
+            ('res_id', '=', self.id),
+        ]
+        if after_id:
+            domain.append(('id', '>', after_id))
+        return self.env['spreadsheet.revision'].sudo().with_context(
+            active_test=False,
+        ).search(domain, order='id asc')
+
+    def _som_revision_count(self, up_to_id):
+        return self.env['spreadsheet.revision'].sudo().with_context(
+            active_test=False,
+        ).search_count([
+            ('res_model', '=', 'documents.document'),
+            ('res_id', '=', self.id),
+            ('id', '<=', up_to_id),
+        ])
+
+    def _som_state_base_key(self, raw):
+        """Huella de la base (snapshot o spreadsheet_data, tal como viene del
+        campo) del estado; no se parsea."""
+        if isinstance(raw, (dict, list)):
+            raw = json.dumps(raw, sort_keys=True, default=str)
+        if isinstance(raw, str):
+            raw = raw.encode('utf-8')
+        return hashlib.sha1(raw or b'').hexdigest()
+
+    def _som_state_cache_get(self, flavor, raw):
+        """Entrada de caché de ``flavor`` vigente para la base ``raw``, o
+        None. La entrada trae ``rev_id`` (última revisión aplicada) más el
+        estado guardado por el lector."""
+        self.ensure_one()
+        value = self.sudo()[self._SOM_STATE_CACHE_FIELDS[flavor]]
+        if not value:
+            return None
+        header, _sep, payload = value.partition('\n')
+        try:
+            base, rev_id, rev_count = header.split(' ')
+            rev_id, rev_count = int(rev_id), int(rev_count)
+        except ValueError:
+            return None
+        if base != self._som_state_base_key(raw):
+            return None
+        # Si se purgó alguna revisión ya aplicada, el estado guardado ya no
+        # corresponde a la historia del documento: se recalcula completo.
+        if self._som_revision_count(rev_id) != rev_count:
+            return None
+        try:
+            entry = json.loads(payload)
+        except ValueError:
+            return None
+        entry['rev_id'] = rev_id
+        return entry
+
+    def _som_state_cache_put(self, flavor, raw, last_rev_id, payload):
+        """Guarda el estado de ``flavor`` tras aplicar hasta ``last_rev_id``.
+
+        Se escribe por SQL y solo si la fila no está bloqueada: es un caché
+        de lectura, no debe mover write_date del documento ni competir con
+        el guardado colaborativo del spreadsheet."""
+        self.ensure_one()
+        column = self._SOM_STATE_CACHE_FIELDS[flavor]
+        value = '%s %d %d\n%s' % (
+            self._som_state_base_key(raw),
+            last_rev_id,
+            self._som_revision_count(last_rev_id),
+            json.dumps(payload, ensure_ascii=False, default=str),
+        )
+        try:
+            with self.env.cr.savepoint():
+                self.env.cr.execute(
+                    f"""
+                    UPDATE documents_document
+                       SET {column} = %s
+                     WHERE id IN (
+                        SELECT id FROM documents_document
+                         WHERE id = %s
+                           FOR UPDATE SKIP LOCKED
+                     )
+                    """,
+                    (value, self.id),
+                )
+        except Exception as e:
+            _logger.info("[PL_DEBUG] No se pudo guardar caché de celdas doc %s: %s", self.id, e)
+        self.invalidate_recordset([column])
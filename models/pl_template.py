@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Plantilla de las hojas del Packing List (una hoja por producto).
+
+Fila 1: ``PRODUCTO:`` y ``Nombre (CODIGO)`` en B1; fila 3: cabeceras; datos
+desde la fila 4. Las columnas se definen solo aquí: de esta definición salen
+la hoja que genera el picking, la escritura del portal al spreadsheet y la
+lectura de los CSV/XLSX que sube el proveedor.
+"""
+import base64
+import io
+
+# (llave de la fila del portal, cabecera). En Pieza/Formato no hay
+# Largo/Alto: todo se recorre a la izquierda.
+COMMON_COLUMNS = (
+    ('peso', 'Peso (kg)'),
+    ('color', 'Notas'),
+    ('bloque', 'Bloque'),
+    ('numero_placa', 'No. Placa'),
+    ('atado', 'Atado'),
+    ('grupo_name', 'Grupo'),
+    ('pedimento', 'Pedimento'),
+    ('contenedor', 'Contenedor'),
+    ('ref_proveedor', 'Ref. Proveedor'),
+    ('ref_interna', 'Ref. Interna'),
+)
+COLUMNS = {
+    'Placa': (('ancho', 'Largo (m)'), ('alto', 'Alto (m)'), ('grosor', 'Grosor (cm)')) + COMMON_COLUMNS,
+    'Pieza': (('grosor', 'Grosor (cm)'), ('quantity', 'Cantidad')) + COMMON_COLUMNS,
+}
+
+
+def columns(unit_type):
+    """Columnas de la hoja de un producto con ``x_unidad_del_producto``
+    ``unit_type`` (Formato y demás usan el layout de Pieza)."""
+    return COLUMNS['Placa' if unit_type == 'Placa' else 'Pieza']
+
+
+def column_index(unit_type):
+    """``{llave: columna 0-based}`` de ``columns(unit_type)``."""
+    return {key: col for col, (key, _header) in enumerate(columns(unit_type))}
+
+
+def iter_excel_sheets(excel_file):
+    """Abre un .xlsx (base64) en modo streaming: ``read_only`` +
+    ``iter_rows(values_only=True)``.
+
+    Devuelve un iterador de ``(título, valor B1, filas)`` por hoja, donde
+    ``filas`` entrega tuplas de valores desde la fila 4 (1-3 son la cabecera
+    de la plantilla). La memoria queda plana aun con libros de miles de
+    filas y se evita el costo de ``sheet.cell(r, c)`` por celda.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(
+        io.BytesIO(base64.b64decode(excel_file)), read_only=True, data_only=True
+    )
+    return iter_workbook_sheets(wb)
+
+
+def iter_workbook_sheets(wb):
+    try:
+        for sheet in wb.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            header = [next(rows, ()) or () for _ in range(3)]
+            b1 = header[0][1] if len(header[0]) > 1 else None
+            yield sheet.title, b1, rows
+    finally:
+        wb.close()
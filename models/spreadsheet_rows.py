@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Operaciones de filas de Odoo Spreadsheet sobre celdas indexadas por
+``(col, fila)`` 0-based.
+
+Las comparten el lector del spreadsheet del picking y el wizard de
+importación de PL: si alguien inserta o borra filas en la hoja, las
+revisiones ADD_COLUMNS_ROWS / REMOVE_COLUMNS_ROWS recorren las celdas que
+están debajo y ambos deben reproducirlo igual.
+"""
+import bisect
+
+
+def is_row_operation(cmd):
+    return (
+        cmd.get('type') in ('ADD_COLUMNS_ROWS', 'REMOVE_COLUMNS_ROWS')
+        and str(cmd.get('dimension') or '').lower() == 'row'
+    )
+
+
+def remove_rows(cells, elements):
+    """Borra las filas ``elements`` en UNA pasada: cada celda baja tantas
+    filas como filas borradas haya por encima (bisect sobre la lista
+    ordenada)."""
+    removed = sorted({int(r) for r in elements})
+    if not removed:
+        return cells
+    removed_set = set(removed)
+    return {
+        (c, r - bisect.bisect_left(removed, r)): val
+        for (c, r), val in cells.items()
+        if r not in removed_set
+    }
+
+
+def insert_rows(cells, start, quantity):
+    """Inserta ``quantity`` filas vacías a partir de ``start``."""
+    if quantity <= 0:
+        return cells
+    return {
+        (c, r + quantity if r >= start else r): val
+        for (c, r), val in cells.items()
+    }
+
+
+def apply_row_operation(cells, cmd):
+    """Aplica un comando de filas (ver ``is_row_operation``) a ``cells``."""
+    if cmd.get('type') == 'REMOVE_COLUMNS_ROWS':
+        return remove_rows(cells, cmd.get('elements') or [])
+    base = int(cmd.get('base') or 0)
+    start = base if cmd.get('position') == 'before' else base + 1
+    return insert_rows(cells, start, int(cmd.get('quantity') or 0))
@@ -3,12 +3,113 @@ from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 import io
 import base64
+import hashlib
 import logging
 import json
 import re
+import uuid
+
+import psycopg2
+
+from . import pl_template, spreadsheet_rows
 
 _logger = logging.getLogger(__name__)
 
+# Escritura del portal al spreadsheet de PL: se agregan solo las celdas que
+# cambiaron como una revisión más. Se compacta a una base nueva (reescribiendo
+# el JSON y purgando el historial) solo al pasar estos umbrales.
+PL_PATCH_MAX_REVISIONS = 200
+PL_PATCH_MAX_COMMANDS = 5000
+
+
+class _SheetProductResolver:
+    """Resuelve la cabecera de producto de una hoja (B1 = ``Nombre (CODIGO)``).
+
+    Respeta el orden de intentos de la búsqueda histórica (name/default_code
+    exacto, luego ilike; primero con el texto limpio y después con el nombre
+    corto). Primero se agotan las coincidencias exactas, en los productos del
+    picking y luego en la base; solo después se prueba ilike, en el mismo
+    orden: un ilike contra el picking no le gana a un código exacto de otro
+    producto. Cada fase hace a lo más UNA búsqueda para todas las cabeceras
+    pendientes y cada cabecera se resuelve una sola vez.
+    """
+
+    def __init__(self, env, products=None):
+        self.env = env
+        self._products = products or env['product.product']
+        self._resolved = {}
+
+    @staticmethod
+    def _norm(text):
+        return re.sub(r'\s+', ' ', str(text or '')).strip()
+
+    @classmethod
+    def _attempts(cls, raw):
+        clean = cls._norm(re.sub(r'\(\s*\)', '', cls._norm(raw)))
+        short = cls._norm(clean.split('(')[0])
+        # La plantilla imprime "Nombre (CODIGO)": el código es la llave más
+        # precisa cuando viene.
+        code = re.search(r'\(([^()]+)\)\s*$', clean)
+        attempts = [('default_code', '=', cls._norm(code.group(1)))] if code else []
+        for value in ([clean, short] if short != clean else [clean]):
+            if value:
+                attempts.extend([
+                    ('name', '=', value),
+                    ('default_code', '=', value),
+                    ('name', 'ilike', value),
+                    ('default_code', 'ilike', value),
+                ])
+        return attempts
+
+    @staticmethod
+    def _match(products, attempts):
+        for field_name, operator, value in attempts:
+            needle = value.lower()
+            for product in products:
+                hay = (product[field_name] or '').lower()
+                if (hay == needle) if operator == '=' else (needle in hay):
+                    return product
+        return None
+
+    def prefetch(self, headers):
+        pending = {}
+        for raw in headers:
+            key = self._norm(raw)
+            if key and key not in self._resolved and key not in pending:
+                pending[key] = self._attempts(key)
+
+        for exact in (True, False):
+            phase = {}
+            for key, attempts in pending.items():
+                attempts = [a for a in attempts if (a[1] == '=') == exact]
+                product = self._match(self._products, attempts)
+                if product:
+                    self._resolved[key] = product
+                elif attempts:
+                    phase[key] = attempts
+            if phase:
+                terms = {t for attempts in phase.values() for t in attempts}
+                domain = ['|'] * (len(terms) - 1) + [list(t) for t in sorted(terms)]
+                found = self.env['product.product'].search(domain)
+                for key, attempts in phase.items():
+                    product = self._match(found, attempts)
+                    if product:
+                        self._resolved[key] = product
+            pending = {key: a for key, a in pending.items() if key not in self._resolved}
+            if not pending:
+                return
+        for key in pending:
+            self._resolved[key] = None
+
+    def resolve(self, header):
+        """Producto de la cabecera o None."""
+        key = self._norm(header)
+        if not key:
+            return None
+        self.prefetch([key])
+        return self._resolved.get(key)
+
+
 class StockPicking(models.Model):
     _inherit = 'stock.picking'
     
@@ -59,6 +160,11 @@ class StockPicking(models.Model):
     supplier_gross_weight = fields.Float(string="Peso bruto (kg)")
     supplier_volume = fields.Float(string="Volumen (m³)")
     supplier_status = fields.Char(string="Estatus (en stock)")
+    # Huella de lo último que el portal escribió en este picking (filas de su
+    # PO + cabecera + spreadsheet destino). Si la siguiente sincronización trae
+    # exactamente lo mismo, no se toca ni la cabecera ni el spreadsheet.
+    supplier_portal_pl_hash = fields.Char(
+        string="Huella de sincronización del portal", copy=False, readonly=True)
     
     @api.depends('packing_list_file', 'spreadsheet_id', 'supplier_access_ids')
     def _compute_has_packing_list(self):
@@ -69,7 +175,7 @@ class StockPicking(models.Model):
     #  LOGICA DE LECTURA (Server -> Portal)
     # -------------------------------------------------------------------------
 
-    def _resolve_sheet_product(self, sheet):
+    def _resolve_sheet_product(self, sheet, resolver=None):
         """Resuelve el producto al que pertenece una hoja del spreadsheet.
 
         Prioriza el id determinista de la hoja (``pl_sheet_<id>`` /
@@ -89,13 +195,27 @@ class StockPicking(models.Model):
             if product.exists():
                 return product
 
-        b1_val = sheet.get('cells', {}).get("B1", {}).get("content", "")
+        b1_val = self._sheet_b1(sheet)
         if not b1_val:
             return self.env['product.product']
-        p_ref = str(b1_val).split('(')[0].strip()
-        return self.env['product.product'].search([
-            '|', ('name', 'ilike', p_ref), ('default_code', 'ilike', p_ref)
-        ], limit=1)
+        resolver = resolver or self._sheet_product_resolver()
+        return resolver.resolve(b1_val) or self.env['product.product']
+
+    @staticmethod
+    def _sheet_b1(sheet):
+        return (sheet.get('cells', {}).get("B1") or {}).get("content", "")
+
+    def _sheet_product_resolver(self, sheets=None):
+        """Resolvedor de cabeceras de producto compartido por todas las hojas
+        de una lectura/importación. Con ``sheets`` precarga de una vez las
+        cabeceras B1 de las hojas sin id determinista."""
+        resolver = _SheetProductResolver(self.env, self.move_ids.product_id)
+        if sheets:
+            resolver.prefetch([
+                self._sheet_b1(sheet) for sheet in sheets
+                if not re.search(r'_sheet_(\d+)$', str(sheet.get('id') or ''))
+            ])
+        return resolver
 
     def get_packing_list_data_for_portal(self):
         """
@@ -114,11 +234,12 @@ class StockPicking(models.Model):
             return rows
 
         sheets = data.get('sheets', [])
-        
+        resolver = self._sheet_product_resolver(sheets)
+
         for sheet in sheets:
             cells = sheet.get('cells', {})
 
-            product = self._resolve_sheet_product(sheet)
+            product = self._resolve_sheet_product(sheet, resolver)
             if not product: continue
 
             unit_type = str(product.product_tmpl_id.x_unidad_del_producto or 'Placa').strip().capitalize()
@@ -229,33 +350,64 @@ class StockPicking(models.Model):
         return rows
 
     def _get_current_spreadsheet_state(self, doc):
-        data = {}
-        if doc.spreadsheet_snapshot:
-            try:
-                raw = doc.spreadsheet_snapshot
-                data = json.loads(raw.decode('utf-8') if isinstance(raw, bytes) else raw)
-            except Exception as e:
-                _logger.warning(f"[PL_DEBUG] Error leyendo snapshot: {e}")
-
-        if not data and doc.spreadsheet_data:
+        """Estado actual del spreadsheet (base + revisiones).
+
+        Parte del estado materializado en el documento (caché 'picking') y
+        aplica solo las revisiones posteriores a la última ya aplicada; el
+        resultado se vuelve a guardar para la siguiente lectura. La base
+        (snapshot o spreadsheet_data) solo se parsea si no hay caché vigente
+        para ella.
+
+        Igual que el wizard de PL (_get_current_sheet_indexes), sobre un
+        snapshot solo se aplican las revisiones posteriores a su
+        ``revisionId``: las anteriores ya están en él, y re-aplicar una
+        inserción o borrado de filas recorrería las filas dos veces."""
+        doc_sudo = doc.sudo()
+        data, raw, cached, start_after = {}, None, None, None
+        for is_snapshot, raw in ((True, doc.spreadsheet_snapshot), (False, doc.spreadsheet_data)):
+            if not raw:
+                continue
+            cached = doc_sudo._som_state_cache_get('picking', raw)
+            if cached:
+                data = cached['data']
+                start_after = cached.get('wait_for')
+                break
             try:
-                raw = doc.spreadsheet_data
                 data = json.loads(raw.decode('utf-8') if isinstance(raw, bytes) else raw)
             except Exception as e:
-                return {}
+                _logger.warning(f"[PL_DEBUG] Error leyendo spreadsheet {doc.id}: {e}")
+            if data:
+                if is_snapshot:
+                    start_after = data.get('revisionId') or False
+                break
 
         if not data: return {}
-
-        revisions = self.env['spreadsheet.revision'].sudo().with_context(active_test=False).search([
-            ('res_model', '=', 'documents.document'),
-            ('res_id', '=', doc.id)
-        ], order='id asc')
-
-        if not revisions: return data
-
+        if start_after is False:
+            # Snapshot sin revisionId: se usa tal cual (como el wizard de PL).
+            if not cached:
+                doc_sudo._som_state_cache_put('picking', raw, 0, {'data': data, 'wait_for': False})
+            return data
+
+        revisions = doc_sudo._som_spreadsheet_revisions(
+            after_id=cached['rev_id'] if cached else 0)
+
+        if not revisions:
+            # Sin revisiones también se guarda (rev_id 0): la siguiente
+            # lectura no vuelve a parsear la base.
+            if not cached:
+                doc_sudo._som_state_cache_put('picking', raw, 0, {'data': data, 'wait_for': start_after})
+            return data
+
+        started = not start_after
         for rev in revisions:
             try:
                 cmds_payload = json.loads(rev.commands) if isinstance(rev.commands, str) else rev.commands
+                if not started:
+                    rev_uuid = cmds_payload.get('id') if isinstance(cmds_payload, dict) else None
+                    started = start_after in (rev_uuid, getattr(rev, 'revision_uuid', None))
+                    continue
+                if isinstance(cmds_payload, dict) and cmds_payload.get('type') == 'SNAPSHOT_CREATED':
+                    continue
                 cmds = cmds_payload.get('commands', []) if isinstance(cmds_payload, dict) else (cmds_payload if isinstance(cmds_payload, list) else [cmds_payload])
 
                 for cmd in cmds:
@@ -263,9 +415,15 @@ class StockPicking(models.Model):
                         self._apply_update_cell(data, cmd)
                     elif cmd.get('type') in ('DELETE_CONTENT', 'CLEAR_CELL'):
                         self._apply_clear_cell(data, cmd)
+                    elif spreadsheet_rows.is_row_operation(cmd):
+                        self._apply_row_operation(data, cmd)
             except Exception:
                 continue
-        
+
+        doc_sudo._som_state_cache_put('picking', raw, revisions[-1].id, {
+            'data': data,
+            'wait_for': None if started else start_after,
+        })
         return data
 
     def _apply_update_cell(self, data, cmd):
@@ -297,6 +455,25 @@ class StockPicking(models.Model):
                     if cell_key in target_sheet['cells']:
                         del target_sheet['cells'][cell_key]
 
+    def _apply_row_operation(self, data, cmd):
+        """Filas insertadas/borradas en la hoja: recorre las celdas de abajo
+        igual que el wizard de PL (ver spreadsheet_rows)."""
+        sheet_id = cmd.get('sheetId')
+        target_sheet = next((s for s in data.get('sheets', []) if s.get('id') == sheet_id), None)
+        if not target_sheet or not target_sheet.get('cells'): return
+
+        cells, others = {}, {}
+        for key, cell in target_sheet['cells'].items():
+            match = re.match(r'^([A-Z]+)(\d+)$', key)
+            if match:
+                cells[(self._get_col_index(match.group(1)), int(match.group(2)) - 1)] = cell
+            else:
+                others[key] = cell
+
+        shifted = spreadsheet_rows.apply_row_operation(cells, cmd)
+        others.update({f"{self._get_col_letter(c)}{r + 1}": cell for (c, r), cell in shifted.items()})
+        target_sheet['cells'] = others
+
     # -------------------------------------------------------------------------
     #  LOGICA DE ESCRITURA (Portal -> Odoo)
     # -------------------------------------------------------------------------
@@ -305,8 +482,15 @@ class StockPicking(models.Model):
         """
         Recibe filas consolidadas.
         Escribe en el Spreadsheet. Si es Pieza/Formato, recorre las columnas para no dejar huecos.
+        Si filas y cabecera son las mismas de la última escritura (misma
+        huella), no se escribe nada. La huella solo se guarda si las filas
+        quedaron escritas en el spreadsheet.
         """
         self.ensure_one()
+
+        fingerprint = self._portal_pl_fingerprint(rows, header_data)
+        if fingerprint == self.supplier_portal_pl_hash:
+            return True
         
         # --- A. GUARDAR CABECERA ---
         if header_data:
@@ -333,103 +517,187 @@ class StockPicking(models.Model):
             self.write(vals)
 
         # --- B. ACTUALIZAR SPREADSHEET ---
-        if not rows: return True
+        if rows and not self._pl_write_portal_rows(rows):
+            # Sin huella: la siguiente sincronización lo vuelve a intentar.
+            return True
+
+        # La huella incluye el spreadsheet destino: se recalcula por si se
+        # acaba de crear.
+        self.write({'supplier_portal_pl_hash': self._portal_pl_fingerprint(rows, header_data)})
+        return True
+
+    def _portal_pl_fingerprint(self, rows, header_data):
+        payload = {
+            'rows': rows or [],
+            'header': header_data or {},
+            'spreadsheet_id': self.spreadsheet_id.id,
+        }
+        return hashlib.sha1(
+            json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+
+    def _pl_write_portal_rows(self, rows):
+        """Lleva ``rows`` al spreadsheet del PL. Devuelve True si la hoja
+        quedó con esas filas (también si ya las tenía) y False si no se pudo
+        escribir (sin estado legible o revisión rechazada)."""
         if not self.spreadsheet_id: self.action_open_packing_list_spreadsheet()
-        
+
         doc = self.spreadsheet_id
         data = self._get_current_spreadsheet_state(doc)
-        if not data: return True
+        if not data:
+            _logger.warning("[PL_DEBUG] Spreadsheet %s sin estado legible: no se escriben filas del portal.", doc.id)
+            return False
 
-        product_sheet_map = {} 
-        sheets = data.get('sheets', [])
-        
-        # Mapear productos a hojas y limpiar datos viejos
-        for sheet in sheets:
-            cells = sheet.get('cells', {})
-            product = self._resolve_sheet_product(sheet)
-
-            if product:
-                product_sheet_map[product.id] = sheet
-                keys_to_remove = []
-                for key in list(cells.keys()):
-                    match = re.match(r'^([A-Z]+)(\d+)$', key)
-                    if match:
-                        row_num = int(match.group(2))
-                        if row_num >= 4:
-                            keys_to_remove.append(key)
-                for k in keys_to_remove:
-                    del cells[k]
+        commands = self._pl_portal_patch_commands(data, rows)
+        if not commands:
+            return True
+
+        if self._pl_needs_compaction(doc, commands):
+            self._pl_compact_spreadsheet(doc, data, commands)
+            return True
 
+        accepted = self._pl_dispatch_revision(doc, commands)
+        if accepted is None:
+            # Sin edición colaborativa no hay revisiones que perder.
+            self._pl_compact_spreadsheet(doc, data, commands)
+            return True
+        if not accepted:
+            # Otra revisión entró primero. Compactar la borraría y, dentro de
+            # esta transacción, releer devuelve la misma foto: se deja para
+            # la siguiente sincronización (la huella no se guarda).
+            _logger.warning(
+                "[PL_DEBUG] Spreadsheet %s: revisión del portal rechazada por una edición concurrente.",
+                doc.id,
+            )
+        return bool(accepted)
+
+    def _pl_portal_row_cells(self, unit_type, row):
+        """Contenido por columna (0 = A) de una fila del portal en la hoja de
+        su producto, según ``pl_template.columns``. La columna Ref. Interna
+        marca la fila como actualizada desde el portal."""
+        cells = {}
+        for col, (key, _header) in enumerate(pl_template.columns(unit_type)):
+            val = "Actualizado Portal" if key == 'ref_interna' else row.get(key)
+            if val is not None and str(val) != '':
+                cells[col] = str(val)
+        return cells
+
+    def _pl_portal_patch_commands(self, data, rows):
+        """Comandos UPDATE_CELL que llevan las filas de datos (4 en adelante)
+        de cada hoja de producto del estado actual ``data`` a las ``rows`` del
+        portal. Solo se emiten las celdas que cambian; las que sobran se
+        vacían."""
         rows_by_product = {}
         for row in rows:
             try:
                 pid = int(row.get('product_id'))
-                if pid not in rows_by_product: rows_by_product[pid] = []
-                rows_by_product[pid].append(row)
+                rows_by_product.setdefault(pid, []).append(row)
             except: continue
 
-        for pid, prod_rows in rows_by_product.items():
-            sheet = product_sheet_map.get(pid)
-            if not sheet: continue
-            
-            product_obj = self.env['product.product'].browse(pid)
-            unit_type = str(product_obj.product_tmpl_id.x_unidad_del_producto or 'Placa').strip().capitalize()
+        sheets = data.get('sheets', [])
+        resolver = self._sheet_product_resolver(sheets)
+        sheet_products = [(sheet, self._resolve_sheet_product(sheet, resolver)) for sheet in sheets]
+        # Si dos hojas resuelven al mismo producto, las filas van a la última.
+        target_sheets = {product.id: id(sheet) for sheet, product in sheet_products if product}
+
+        commands = []
+        for sheet, product in sheet_products:
+            if not product:
+                continue
 
-            current_row = 4
-            for row in prod_rows:
-                def set_c(col_letter, val):
-                    if val is not None:
-                        if 'cells' not in sheet: sheet['cells'] = {}
-                        sheet['cells'][f"{col_letter}{current_row}"] = {"content": str(val)}
+            current = {}
+            for key, cell in (sheet.get('cells') or {}).items():
+                match = re.match(r'^([A-Z]+)(\d+)$', key)
+                if not match or int(match.group(2)) < 4:
+                    continue
+                content = str((cell or {}).get('content') or '')
+                if content:
+                    current[(int(match.group(2)) - 1, self._get_col_index(match.group(1)))] = content
+
+            desired = {}
+            unit_type = str(product.product_tmpl_id.x_unidad_del_producto or 'Placa').strip().capitalize()
+            product_rows = rows_by_product.get(product.id, []) if target_sheets[product.id] == id(sheet) else []
+            for offset, row in enumerate(product_rows):
+                for col, content in self._pl_portal_row_cells(unit_type, row).items():
+                    desired[(3 + offset, col)] = content
+
+            sheet_id = sheet.get('id')
+            for (row_idx, col), content in sorted(desired.items()):
+                if current.get((row_idx, col)) != content:
+                    commands.append({
+                        'type': 'UPDATE_CELL', 'sheetId': sheet_id,
+                        'col': col, 'row': row_idx, 'content': content,
+                    })
+            for row_idx, col in sorted(set(current) - set(desired)):
+                commands.append({
+                    'type': 'UPDATE_CELL', 'sheetId': sheet_id,
+                    'col': col, 'row': row_idx, 'content': '',
+                })
+        return commands
+
+    def _get_col_index(self, letters):
+        index = 0
+        for char in letters:
+            index = index * 26 + (ord(char) - 64)
+        return index - 1
+
+    def _pl_needs_compaction(self, doc, commands):
+        if len(commands) > PL_PATCH_MAX_COMMANDS:
+            return True
+        return self.env['spreadsheet.revision'].sudo().with_context(
+            active_test=False,
+        ).search_count([
+            ('res_model', '=', 'documents.document'),
+            ('res_id', '=', doc.id),
+        ]) >= PL_PATCH_MAX_REVISIONS
+
+    def _pl_dispatch_revision(self, doc, commands):
+        """Agrega ``commands`` al spreadsheet como una revisión colaborativa
+        (la ven en vivo los usuarios que lo tengan abierto). Devuelve None si
+        el documento no admite revisiones y False si la revisión no fue
+        aceptada porque otra revisión entró primero. Cualquier otro error se
+        propaga."""
+        doc_sudo = doc.sudo()
+        if not hasattr(doc_sudo, 'dispatch_spreadsheet_message') \
+                or not hasattr(doc_sudo, '_get_current_revision_uuid'):
+            return None
+        try:
+            with self.env.cr.savepoint():
+                accepted = doc_sudo.dispatch_spreadsheet_message({
+                    'type': 'REMOTE_REVISION',
+                    'version': 1,
+                    'clientId': 'supplier_portal',
+                    'serverRevisionId': doc_sudo._get_current_revision_uuid(),
+                    'nextRevisionId': uuid.uuid4().hex,
+                    'commands': commands,
+                })
+        except psycopg2.IntegrityError:
+            # Revisión con el mismo padre guardada por otra sesión.
+            return False
+        return bool(accepted)
+
+    def _pl_compact_spreadsheet(self, doc, data, commands):
+        """Aplica ``commands`` sobre ``data`` y lo guarda como base nueva del
+        spreadsheet, descartando snapshot y revisiones (también las
+        archivadas: si sobrevivieran se re-aplicarían sobre la base nueva)."""
+        for cmd in commands:
+            self._apply_update_cell(data, cmd)
+        if 'revisionId' in data:
+            # Sin revisiones, la base parte de la revisión inicial.
+            data['revisionId'] = 'START_REVISION'
 
-                # --- ESCRITURA CON RECORRIDO ---
-                if unit_type == 'Placa':
-                    # PLACA: Estructura Completa
-                    # A=Largo, B=Alto, C=Grosor, D=Peso, E=Notas, F=Bloque, G=Placa, H=Atado, I=Grupo, J=Pedimento, K=Contenedor, L=RefProv
-                    set_c("A", row.get('ancho', ''))
-                    set_c("B", row.get('alto', ''))
-                    set_c("C", row.get('grosor', ''))
-                    set_c("D", row.get('peso', ''))
-                    set_c("E", row.get('color', ''))
-                    set_c("F", row.get('bloque', ''))
-                    set_c("G", row.get('numero_placa', ''))
-                    set_c("H", row.get('atado', ''))
-                    set_c("I", row.get('grupo_name', '')) 
-                    set_c("J", row.get('pedimento', ''))  
-                    set_c("K", row.get('contenedor', '')) 
-                    set_c("L", row.get('ref_proveedor', '')) 
-                    set_c("M", "Actualizado Portal")
-                else:
-                    # PIEZA: Estructura Recorrida (Se salta la columna de ancho "extra")
-                    # A=Grosor, B=Cantidad. C=Peso (Antes D). D=Notas (Antes E)...
-                    set_c("A", row.get('grosor', ''))
-                    set_c("B", row.get('quantity'))
-                    set_c("C", row.get('peso', ''))    # Recorrido
-                    set_c("D", row.get('color', ''))   # Recorrido
-                    set_c("E", row.get('bloque', ''))  # Recorrido
-                    set_c("F", row.get('numero_placa', '')) # Recorrido
-                    set_c("G", row.get('atado', ''))   # Recorrido
-                    set_c("H", row.get('grupo_name', '')) # Recorrido
-                    set_c("I", row.get('pedimento', ''))  # Recorrido
-                    set_c("J", row.get('contenedor', '')) # Recorrido
-                    set_c("K", row.get('ref_proveedor', '')) # Recorrido
-                    set_c("L", "Actualizado Portal") # Recorrido
-
-                current_row += 1
-
-        new_json = json.dumps(data)
         doc.write({
-            'spreadsheet_data': new_json,
-            'spreadsheet_snapshot': False, 
+            'spreadsheet_data': json.dumps(data),
+            'spreadsheet_snapshot': False,
         })
-        
-        self.env['spreadsheet.revision'].sudo().search([
+
+        self.env['spreadsheet.revision'].sudo().with_context(
+            active_test=False,
+        ).search([
             ('res_model', '=', 'documents.document'),
             ('res_id', '=', doc.id)
         ]).unlink()
 
-        return True
-
     def _process_portal_attachments(self, files_list):
         Attachment = self.env['ir.attachment']
         for file_data in files_list:
@@ -471,18 +739,12 @@ class StockPicking(models.Model):
         """Construye la definición de una hoja del spreadsheet de PL para un
         producto (cabeceras según placa/pieza). ``taken_names`` evita nombres de
         hoja duplicados."""
-        common_headers_suffix = ['Peso (kg)', 'Notas', 'Bloque', 'No. Placa', 'Atado', 'Grupo', 'Pedimento', 'Contenedor', 'Ref. Proveedor', 'Ref. Interna']
         cells = {}
         cells["A1"] = self._make_cell("PRODUCTO:")
         cells["B1"] = self._make_cell(f"{product.name} ({product.default_code or ''})")
 
         unit_type = str(product.product_tmpl_id.x_unidad_del_producto or 'Placa').strip().capitalize()
-        if unit_type == 'Placa':
-            headers = ['Largo (m)', 'Alto (m)', 'Grosor (cm)'] + common_headers_suffix
-        else:
-            headers = ['Grosor (cm)', 'Cantidad'] + common_headers_suffix
-
-        for i, header in enumerate(headers):
+        for i, (_key, header) in enumerate(pl_template.columns(unit_type)):
             if header:
                 cells[f"{self._get_col_letter(i)}3"] = self._make_cell(header, style=1)
 
@@ -520,8 +782,9 @@ class StockPicking(models.Model):
             return
 
         existing_product_ids = set()
+        resolver = self._sheet_product_resolver(data['sheets'])
         for sheet in data['sheets']:
-            prod = self._resolve_sheet_product(sheet)
+            prod = self._resolve_sheet_product(sheet, resolver)
             if prod:
                 existing_product_ids.add(prod.id)
 
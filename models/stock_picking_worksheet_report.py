@@ -31,21 +31,24 @@ class StockPicking(models.Model):
         product_origin_names no está instalado o no hay nombres."""
         if not product:
             return ''
-        tmpl = product.product_tmpl_id
-        if 'origin_name_ids' not in tmpl._fields:
-            return ''
-        origins = tmpl.origin_name_ids
-        if not origins:
-            return ''
-        match = origins
-        if partner:
-            partner_match = origins.filtered(
-                lambda o: o.partner_id and o.partner_id.id == partner.id
-            )
-            if partner_match:
-                match = partner_match
-        # origin_name_ids ya viene ordenado por secuencia (_order del modelo).
-        return match[0].name or ''
+        return self._ws_origin_names(product, partner).get(product.id, '')
+
+    def _ws_origin_names(self, products, partner):
+        """{product_id: nombre de origen} de todos los productos del reporte
+        con una sola lectura de nombres de origen (misma regla que
+        _ws_get_origin_name)."""
+        from ..services.supplier_portal_base import origin_names_by_template
+
+        by_tmpl = origin_names_by_template(products.product_tmpl_id)
+        result = {}
+        for product in products:
+            origins = by_tmpl.get(product.product_tmpl_id.id) or []
+            if not origins:
+                result[product.id] = ''
+                continue
+            specific = [name for pid, name in origins if partner and pid == partner.id]
+            result[product.id] = (specific or [origins[0][1]])[0] or ''
+        return result
 
     def _ws_get_linked_transit_voyage_for_report(self):
         self.ensure_one()
@@ -440,6 +443,10 @@ class StockPicking(models.Model):
             avail_w * 0.145,
         ]
 
+        origin_names = self._ws_origin_names(
+            self.env['product.product'].union(*(d['product'] for d in products_data.values())),
+            partner,
+        )
         for pid, pdata in products_data.items():
             product = pdata['product']
             lines = pdata['lines']
@@ -448,7 +455,7 @@ class StockPicking(models.Model):
             headers = headers_placa if is_placa else headers_formato
             col_widths = col_widths_placa if is_placa else col_widths_formato
 
-            origin_name = self._ws_get_origin_name(product, partner)
+            origin_name = origin_names.get(product.id, '')
             origin_html = (
                 ' <font color="#6B4226" size="6">· Origen: %s</font>'
                 % self._ws_safe_text(origin_name)
@@ -2,6 +2,8 @@
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
 
+from .supplier_proforma_header import _mark_portal_revision
+
 
 class SupplierShipmentDocument(models.Model):
     _name = 'supplier.shipment.document'
@@ -109,4 +111,31 @@ class SupplierShipmentDocument(models.Model):
                 vals['shipment_id'] = False
                 vals['proforma_id'] = False
 
-        return super().create(vals_list)
\ No newline at end of file
+        records = super().create(vals_list)
+        records._touch_portal_revision()
+        return records
+
+    def write(self, vals):
+        self._touch_portal_revision()
+        res = super().write(vals)
+        if 'shipment_id' in vals or 'proforma_id' in vals:
+            self._touch_portal_revision()
+        return res
+
+    def unlink(self):
+        self._touch_portal_revision()
+        return super().unlink()
+
+    def _touch_portal_revision(self):
+        """Anota para el commit la revisión del portal de los embarques del
+        documento (ligados por id, sin FK); la de la proforma solo si el
+        documento no es de un embarque."""
+        _mark_portal_revision(
+            self.env,
+            shipments=self.env['supplier.shipment'].browse(
+                [doc.shipment_id for doc in self if doc.shipment_id]
+            ),
+            headers=self.env['supplier.proforma.header'].browse(
+                [doc.proforma_id for doc in self if doc.proforma_id and not doc.shipment_id]
+            ),
+        )
\ No newline at end of file
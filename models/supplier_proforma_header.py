@@ -1,7 +1,67 @@
 # -*- coding: utf-8 -*-
 
+from datetime import timedelta
+import logging
+
 from odoo import api, fields, models
 
+_logger = logging.getLogger(__name__)
+
+
+def _drop_portal_qty_cache(env):
+    """Descarta los agregados de cantidad del portal memorizados en el
+    cursor (SupplierPortalSyncService._shipments_qty_aggregate)."""
+    env.cr.cache.pop('supplier_portal_qty', None)
+
+
+# Campos técnicos que no cambian lo que muestra el portal: escribirlos no
+# mueve la revisión (si no, cada reload que guarda el avance la movería).
+_PORTAL_REVISION_IGNORED_FIELDS = {
+    'portal_revision',
+    'portal_overall_pct',
+    'portal_sync_pending',
+    'portal_sync_requested_at',
+}
+
+
+def _touches_portal_revision(vals):
+    return bool(set(vals) - _PORTAL_REVISION_IGNORED_FIELDS)
+
+
+def _mark_portal_revision(env, shipments=None, headers=None):
+    """Anota ``shipments`` y ``headers`` como cambiados en la transacción.
+
+    La revisión de cada uno se incrementa UNA vez, justo antes del commit
+    (_flush_portal_revisions), y no en cada write del ORM: así un guardado
+    del portal no bloquea la fila de la proforma en cada fila/packing/
+    documento que escribe. La cabecera solo se mueve por cambios propios o
+    por altas/bajas de embarques."""
+    pending = env.cr.precommit.data.get('supplier_portal_revision')
+    if pending is None:
+        pending = env.cr.precommit.data['supplier_portal_revision'] = {
+            'shipments': set(),
+            'headers': set(),
+        }
+        env.cr.precommit.add(lambda: _flush_portal_revisions(env, pending))
+    pending['shipments'].update(sid for sid in (shipments or env['supplier.shipment']).ids if sid)
+    pending['headers'].update(hid for hid in (headers or env['supplier.proforma.header']).ids if hid)
+
+
+def _flush_portal_revisions(env, pending):
+    """Incrementa por SQL (sin mover write_date ni volver a disparar write())
+    la revisión de los embarques y cabeceras anotados en la transacción."""
+    for table, ids in (
+        ('supplier_shipment', pending['shipments']),
+        ('supplier_proforma_header', pending['headers']),
+    ):
+        if ids:
+            env.cr.execute(
+                f"UPDATE {table} SET portal_revision = COALESCE(portal_revision, 0) + 1 WHERE id IN %s",
+                (tuple(ids),),
+            )
+    env['supplier.shipment'].invalidate_model(['portal_revision'])
+    env['supplier.proforma.header'].invalidate_model(['portal_revision'])
+
 
 class SupplierProformaHeader(models.Model):
     _name = 'supplier.proforma.header'
@@ -29,9 +89,21 @@ class SupplierProformaHeader(models.Model):
              'proveedor (el mismo número que él ve). Fuente de verdad del '
              'avance de captura.',
     )
+    # Contador de cambios propios de la proforma y de altas/bajas de sus
+    # embarques. Lo que cuelga de un embarque (contenedores, invoices,
+    # packings, filas, fotos y documentos) mueve la revisión del embarque.
+    # El reload del portal compara ambas con las que tiene el cliente.
+    portal_revision = fields.Integer(
+        string='Revisión del portal',
+        default=0,
+        copy=False,
+        readonly=True,
+    )
 
     def write(self, vals):
         res = super().write(vals)
+        if _touches_portal_revision(vals):
+            _mark_portal_revision(self.env, headers=self)
         # PI capturada en el portal → reflejar en la OC (vínculo PO↔PI).
         if 'proforma_number' in vals and not self.env.context.get('skip_pi_sync'):
             for header in self:
@@ -272,6 +344,27 @@ class SupplierShipment(models.Model):
         compute='_compute_counts',
     )
 
+    # Sincronización diferida portal -> Odoo: los guardados del portal solo
+    # marcan el embarque y una única sincronización corre tras un periodo
+    # sin cambios (cron), o de inmediato al completar/recargar el portal.
+    portal_sync_pending = fields.Boolean(
+        string='Sincronización pendiente',
+        copy=False,
+        index=True,
+    )
+    portal_sync_requested_at = fields.Datetime(
+        string='Última captura sin sincronizar',
+        copy=False,
+    )
+    # Contador de cambios del embarque y de lo que cuelga de él; se
+    # incrementa una vez por transacción (ver _mark_portal_revision).
+    portal_revision = fields.Integer(
+        string='Revisión del portal',
+        default=0,
+        copy=False,
+        readonly=True,
+    )
+
     @api.depends('container_ids', 'invoice_ids', 'packing_ids')
     def _compute_counts(self):
         for rec in self:
@@ -299,7 +392,47 @@ class SupplierShipment(models.Model):
                     vals.setdefault('port_origin', proforma.port_origin or '')
                     vals.setdefault('port_destination', proforma.port_destination or '')
 
-        return super().create(vals_list)
+        records = super().create(vals_list)
+        _mark_portal_revision(self.env, shipments=records, headers=records.proforma_id)
+        return records
+
+    def write(self, vals):
+        headers = self.proforma_id if 'proforma_id' in vals else None
+        res = super().write(vals)
+        if _touches_portal_revision(vals):
+            if headers is not None:
+                headers |= self.proforma_id
+            _mark_portal_revision(self.env, shipments=self, headers=headers)
+        return res
+
+    def unlink(self):
+        headers = self.proforma_id
+        res = super().unlink()
+        _mark_portal_revision(self.env, headers=headers)
+        return res
+
+    @api.model
+    def _cron_sync_pending_portal_shipments(self):
+        """Sincroniza los embarques marcados por el portal cuyo último
+        guardado ya cumplió el periodo de silencio. Un embarque que falla no
+        detiene a los demás; queda marcado para el siguiente intento."""
+        from ..services.supplier_portal_sync import SupplierPortalSyncService
+
+        service = SupplierPortalSyncService(self.sudo().env)
+        threshold = fields.Datetime.now() - timedelta(seconds=service.SYNC_QUIET_SECONDS)
+        shipments = self.sudo().search([
+            ('portal_sync_pending', '=', True),
+            ('portal_sync_requested_at', '<=', threshold),
+        ])
+        for shipment in shipments:
+            try:
+                with self.env.cr.savepoint():
+                    service.sync_shipment(shipment)
+            except Exception:
+                _logger.exception(
+                    "[PL_SYNC] Falló la sincronización diferida del embarque %s.",
+                    shipment.id,
+                )
 
 
 class SupplierShipmentContainer(models.Model):
@@ -331,6 +464,24 @@ class SupplierShipmentContainer(models.Model):
         copy=False,
     )
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        _mark_portal_revision(self.env, shipments=records.shipment_id)
+        return records
+
+    def write(self, vals):
+        shipments = self.shipment_id
+        res = super().write(vals)
+        _mark_portal_revision(self.env, shipments=shipments | self.shipment_id)
+        return res
+
+    def unlink(self):
+        shipments = self.shipment_id
+        res = super().unlink()
+        _mark_portal_revision(self.env, shipments=shipments)
+        return res
+
 
 class SupplierShipmentInvoice(models.Model):
     _name = 'supplier.shipment.invoice'
@@ -373,6 +524,24 @@ class SupplierShipmentInvoice(models.Model):
         copy=False,
     )
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        _mark_portal_revision(self.env, shipments=records.shipment_id)
+        return records
+
+    def write(self, vals):
+        shipments = self.shipment_id
+        res = super().write(vals)
+        _mark_portal_revision(self.env, shipments=shipments | self.shipment_id)
+        return res
+
+    def unlink(self):
+        shipments = self.shipment_id
+        res = super().unlink()
+        _mark_portal_revision(self.env, shipments=shipments)
+        return res
+
 
 class SupplierShipmentPacking(models.Model):
     _name = 'supplier.shipment.packing'
@@ -421,12 +590,41 @@ class SupplierShipmentPacking(models.Model):
         string='Filas',
         compute='_compute_row_count',
     )
+    # Versión de las filas para el autosave por delta del portal: cada
+    # guardado la incrementa y un delta contra una revisión vieja se rechaza.
+    revision = fields.Integer(
+        string='Revisión',
+        default=0,
+        copy=False,
+        readonly=True,
+    )
 
     @api.depends('row_ids')
     def _compute_row_count(self):
         for rec in self:
             rec.row_count = len(rec.row_ids)
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        _mark_portal_revision(self.env, shipments=records.shipment_id)
+        return records
+
+    def write(self, vals):
+        if 'shipment_id' in vals:
+            _drop_portal_qty_cache(self.env)
+        shipments = self.shipment_id
+        res = super().write(vals)
+        _mark_portal_revision(self.env, shipments=shipments | self.shipment_id)
+        return res
+
+    def unlink(self):
+        _drop_portal_qty_cache(self.env)
+        shipments = self.shipment_id
+        res = super().unlink()
+        _mark_portal_revision(self.env, shipments=shipments)
+        return res
+
 
 class SupplierShipmentPackingRow(models.Model):
     _name = 'supplier.shipment.packing.row'
@@ -522,6 +720,29 @@ class SupplierShipmentPackingRow(models.Model):
             else:
                 rec.area_m2 = rec.quantity or 0.0
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        _drop_portal_qty_cache(self.env)
+        records = super().create(vals_list)
+        _mark_portal_revision(self.env, shipments=records.packing_id.shipment_id)
+        return records
+
+    def write(self, vals):
+        _drop_portal_qty_cache(self.env)
+        shipments = self.packing_id.shipment_id
+        res = super().write(vals)
+        if 'packing_id' in vals:
+            shipments |= self.packing_id.shipment_id
+        _mark_portal_revision(self.env, shipments=shipments)
+        return res
+
+    def unlink(self):
+        _drop_portal_qty_cache(self.env)
+        shipments = self.packing_id.shipment_id
+        res = super().unlink()
+        _mark_portal_revision(self.env, shipments=shipments)
+        return res
+
 
 class SupplierShipmentBlockImage(models.Model):
     _name = 'supplier.shipment.block.image'
@@ -551,3 +772,21 @@ class SupplierShipmentBlockImage(models.Model):
         'UNIQUE(shipment_id, block_name, product_id)',
         'Ya existe una foto para este bloque y producto en el embarque.',
     )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        _mark_portal_revision(self.env, shipments=records.shipment_id)
+        return records
+
+    def write(self, vals):
+        shipments = self.shipment_id
+        res = super().write(vals)
+        _mark_portal_revision(self.env, shipments=shipments | self.shipment_id)
+        return res
+
+    def unlink(self):
+        shipments = self.shipment_id
+        res = super().unlink()
+        _mark_portal_revision(self.env, shipments=shipments)
+        return res
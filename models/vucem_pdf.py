@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""Procesamiento de PDFs para la carpeta VUCEM.
+
+Rasteriza cada página a >= 300 DPI en escala de grises, tapa los QR, omite
+páginas en blanco y arma un PDF de máximo 3 MB. Son funciones puras (sin
+env ni registros): reciben bytes y devuelven bytes.
+"""
+import io
+import logging
+
+_logger = logging.getLogger(__name__)
+
+MIN_DPI = 300
+MAX_SIZE = 3 * 1024 * 1024
+
+
+def estimate_document_dpi(doc):
+    max_dpi = 72
+    try:
+        for page_num in range(min(len(doc), 3)):
+            page = doc[page_num]
+            rect = page.rect
+            page_width_in = rect.width / 72.0
+            page_height_in = rect.height / 72.0
+
+            if page_width_in <= 0 or page_height_in <= 0:
+                continue
+
+            images = page.get_images(full=True)
+            for img_info in images:
+                xref = img_info[0]
+                try:
+                    base_image = doc.extract_image(xref)
+                    if base_image:
+                        img_w = base_image.get("width", 0)
+                        img_h = base_image.get("height", 0)
+                        if img_w > 100 and img_h > 100:
+                            dpi_w = img_w / page_width_in
+                            dpi_h = img_h / page_height_in
+                            avg_dpi = (dpi_w + dpi_h) / 2
+                            if avg_dpi > max_dpi:
+                                max_dpi = avg_dpi
+                except Exception:
+                    continue
+    except Exception as e:
+        _logger.info("[VUCEM] Error estimando DPI: %s", e)
+
+    return int(round(max_dpi))
+
+
+def is_blank_page(img_gray):
+    try:
+        import numpy as np
+        arr = np.array(img_gray)
+        total_pixels = arr.size
+        if total_pixels == 0:
+            return True
+        white_pixels = np.sum(arr > 250)
+        white_ratio = white_pixels / total_pixels
+        return white_ratio > 0.995
+    except ImportError:
+        width, height = img_gray.size
+        total = width * height
+        if total == 0:
+            return True
+
+        sample_size = min(total, 10000)
+        step = max(1, total // sample_size)
+        pixels = img_gray.getdata()
+
+        white_count = 0
+        checked = 0
+        for i in range(0, total, step):
+            if pixels[i] > 250:
+                white_count += 1
+            checked += 1
+
+        if checked == 0:
+            return True
+        return (white_count / checked) > 0.995
+
+
+def block_qr_codes(img_gray):
+    try:
+        from pyzbar.pyzbar import decode as qr_decode
+        from PIL import ImageDraw
+
+        qr_results = qr_decode(img_gray)
+        if qr_results:
+            draw = ImageDraw.Draw(img_gray)
+            for qr in qr_results:
+                rect = qr.rect
+                x0 = max(0, rect.left - 10)
+                y0 = max(0, rect.top - 10)
+                x1 = min(img_gray.width, rect.left + rect.width + 10)
+                y1 = min(img_gray.height, rect.top + rect.height + 10)
+                draw.rectangle([x0, y0, x1, y1], fill=255)
+
+            _logger.info("[VUCEM] %d QR code(s) bloqueados (parche blanco) en la pagina.", len(qr_results))
+
+    except ImportError:
+        _logger.info("[VUCEM] pyzbar no disponible, QR detection desactivada.")
+    except Exception as e:
+        _logger.warning("[VUCEM] Error detectando QR: %s", e)
+
+    return img_gray
+
+
+def assemble_pdf(page_images, target_dpi):
+    import fitz
+
+    output_doc = fitz.open()
+
+    for img_gray in page_images:
+        img_bytes = io.BytesIO()
+        img_gray.save(img_bytes, format='PDF', resolution=target_dpi)
+        img_bytes.seek(0)
+        img_pdf = fitz.open(stream=img_bytes.read(), filetype="pdf")
+        output_doc.insert_pdf(img_pdf)
+        img_pdf.close()
+
+    result = output_doc.tobytes()
+    output_doc.close()
+    return result
+
+
+# Compresión por predicción: cada página se codifica en JPEG una sola vez por
+# calidad (en memoria) y el tamaño del PDF se predice como la suma de las
+# páginas más un margen fijo por página. La calidad se busca por bisección
+# y el PDF se arma una sola vez con los JPEG ya codificados.
+JPEG_QUALITY_MAX = 85
+JPEG_QUALITY_MIN = 15
+JPEG_QUALITY_STEP = 5
+PDF_PAGE_OVERHEAD = 2048
+
+
+def encode_jpeg_pages(page_images, quality):
+    pages = []
+    for img in page_images:
+        buf = io.BytesIO()
+        img.save(buf, format='JPEG', quality=quality, optimize=True)
+        pages.append(buf.getvalue())
+    return pages
+
+
+def assemble_jpeg_pdf(jpeg_pages, page_sizes, dpi):
+    """PDF con una página por JPEG, incrustado tal cual (sin recodificar)."""
+    import fitz
+
+    output_doc = fitz.open()
+    for data, (width, height) in zip(jpeg_pages, page_sizes):
+        page = output_doc.new_page(width=width * 72.0 / dpi, height=height * 72.0 / dpi)
+        page.insert_image(page.rect, stream=data)
+    result = output_doc.tobytes(garbage=3, deflate=True)
+    output_doc.close()
+    return result
+
+
+def best_jpeg_quality(page_images, max_size, max_quality=JPEG_QUALITY_MAX,
+                      min_quality=JPEG_QUALITY_MIN):
+    """Mayor calidad cuyo tamaño predicho cabe en ``max_size``.
+
+    Devuelve ``(calidad, jpeg_por_pagina)`` o ``(None, None)`` si ni la
+    calidad mínima cabe."""
+    qualities = list(range(min_quality, max_quality + 1, JPEG_QUALITY_STEP))
+    encoded = {}
+
+    def fits(quality):
+        if quality not in encoded:
+            encoded[quality] = encode_jpeg_pages(page_images, quality)
+        predicted = sum(len(data) for data in encoded[quality])
+        return predicted + PDF_PAGE_OVERHEAD * len(page_images) <= max_size
+
+    if not fits(qualities[0]):
+        return None, None
+    lo, hi = 1, len(qualities) - 1
+    best = qualities[0]
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if fits(qualities[mid]):
+            best = qualities[mid]
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    return best, encoded[best]
+
+
+def compress_pages(page_images, target_dpi, max_size, reduced_dpi=None):
+    """PDF de ``page_images`` que no pasa de ``max_size``, o None.
+
+    Si ni la calidad mínima cabe y hay ``reduced_dpi``, se reintenta una vez
+    con las páginas reducidas a ese DPI (calidad máxima 60). Si el PDF real
+    sale más grande de lo predicho, se baja la calidad un escalón."""
+    images, dpi, max_quality = page_images, target_dpi, JPEG_QUALITY_MAX
+    quality, jpeg_pages = best_jpeg_quality(images, max_size, max_quality)
+
+    if quality is None and reduced_dpi:
+        from PIL import Image
+
+        _logger.warning("[VUCEM] Reduciendo DPI a %d para comprimir más.", reduced_dpi)
+        ratio = float(reduced_dpi) / target_dpi
+        images = [
+            img.resize((max(1, int(img.size[0] * ratio)), max(1, int(img.size[1] * ratio))), Image.LANCZOS)
+            for img in page_images
+        ]
+        dpi, max_quality = reduced_dpi, 60
+        quality, jpeg_pages = best_jpeg_quality(images, max_size, max_quality)
+
+    if quality is None:
+        return None
+
+    page_sizes = [img.size for img in images]
+    result = assemble_jpeg_pdf(jpeg_pages, page_sizes, dpi)
+    while len(result) > max_size and quality > JPEG_QUALITY_MIN:
+        quality = max(JPEG_QUALITY_MIN, quality - JPEG_QUALITY_STEP)
+        result = assemble_jpeg_pdf(encode_jpeg_pages(images, quality), page_sizes, dpi)
+    if len(result) > max_size:
+        return None
+
+    _logger.info(
+        "[VUCEM] Compresion exitosa: %d bytes con JPEG quality=%d a %d DPI",
+        len(result), quality, dpi
+    )
+    return result
+
+
+def compress_pdf(page_images, target_dpi, max_size):
+    result = compress_pages(page_images, target_dpi, max_size, reduced_dpi=200)
+    if result:
+        return result
+
+    _logger.warning("[VUCEM] No se pudo comprimir a menos de 3MB. Se retorna mejor resultado.")
+    return assemble_jpeg_pdf(
+        encode_jpeg_pages(page_images, 20), [img.size for img in page_images], target_dpi)
+
+
+def process_pdf(file_bytes):
+    import fitz
+    from PIL import Image
+
+    doc = fitz.open(stream=file_bytes, filetype="pdf")
+    original_dpi = estimate_document_dpi(doc)
+    target_dpi = max(original_dpi, MIN_DPI)
+
+    _logger.info(
+        "[VUCEM] DPI original estimado: %d, DPI objetivo: %d, paginas: %d",
+        original_dpi, target_dpi, len(doc)
+    )
+
+    page_images = []
+    for page_num in range(len(doc)):
+        page = doc[page_num]
+        zoom = target_dpi / 72.0
+        mat = fitz.Matrix(zoom, zoom)
+        pix = page.get_pixmap(matrix=mat, alpha=False)
+
+        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        img_gray = img.convert("L")
+        img_gray = block_qr_codes(img_gray)
+
+        if is_blank_page(img_gray):
+            _logger.info("[VUCEM] Pagina %d detectada como blanco, omitida.", page_num + 1)
+            continue
+
+        page_images.append(img_gray)
+
+    doc.close()
+
+    if not page_images:
+        _logger.warning("[VUCEM] Todas las paginas estan en blanco, se retorna PDF original.")
+        return file_bytes
+
+    result = assemble_pdf(page_images, target_dpi)
+
+    if len(result) > MAX_SIZE:
+        _logger.info("[VUCEM] PDF resultante %d bytes > 3MB. Comprimiendo...", len(result))
+        result = compress_pdf(page_images, target_dpi, MAX_SIZE)
+
+    _logger.info("[VUCEM] PDF final: %d bytes, %d paginas.", len(result), len(page_images))
+    return result
+
+
+def _process_pdf_task(file_bytes):
+    """Procesa un PDF sin lanzar: devuelve ``(pdf_procesado, None)`` o
+    ``(None, error)``."""
+    try:
+        return process_pdf(file_bytes), None
+    except Exception as e:
+        return None, str(e) or e.__class__.__name__
+
+
+def process_pdfs(payloads):
+    """Procesa varios PDFs en serie, en el mismo proceso. El resultado
+    conserva el orden de ``payloads`` (una tupla ``(pdf_procesado, error)``
+    por PDF).
+
+    No se usa un pool de procesos: con ``fork`` desde un worker multihilo
+    de Odoo los hijos pueden quedar bloqueados en locks de otros hilos y no
+    los cubren limit_memory_*/limit_time_cpu, y con ``spawn``/``forkserver``
+    los hijos no pueden importar el addon sin la ruta de addons de Odoo."""
+    return [_process_pdf_task(file_bytes) for file_bytes in payloads]
@@ -8,12 +8,61 @@ from odoo.http import request
 _logger = logging.getLogger(__name__)
 
 
+def origin_names_by_template(templates):
+    """{template_id: [(partner_id, nombre), ...]} por secuencia, leyendo los
+    nombres de origen (product_origin_names) de TODAS las plantillas en una
+    sola consulta. Vacío si el módulo no está instalado."""
+    field = templates._fields.get("origin_name_ids")
+    if not field or not templates:
+        return {}
+    result = {tmpl_id: [] for tmpl_id in templates.ids}
+    origins = templates.env[field.comodel_name].sudo().search_fetch(
+        [(field.inverse_name, "in", templates.ids)],
+        [field.inverse_name, "partner_id", "name", "sequence"],
+        order="sequence, id",
+    )
+    for origin in origins:
+        result[origin[field.inverse_name].id].append(
+            (origin.partner_id.id or 0, origin.name or "")
+        )
+    return result
+
+
 class SupplierPortalBaseService:
     """
     Helpers comunes reutilizables por los servicios del portal.
     Compatibles con Odoo 19.
     """
 
+    # =====================================================================
+    #  MEMO POR PETICIÓN
+    # =====================================================================
+    # Una sola petición del portal (build_portal_view, reload, save_*) pide
+    # varias veces el mismo token, proforma, POs amparadas o nombre de
+    # origen. El memo vive en el caché del cursor de la petición y se
+    # descarta en cada rollback: si Odoo reintenta la petición por un
+    # conflicto de serialización, el reintento no reutiliza registros del
+    # intento fallido. Fuera de una petición (cron) no se memoriza.
+
+    def _request_memo(self):
+        try:
+            cr = request.env.cr
+        except (RuntimeError, AttributeError):
+            return None
+        memo = cr.cache.get("supplier_portal_memo")
+        if memo is None:
+            memo = cr.cache["supplier_portal_memo"] = {}
+            cr.postrollback.add(lambda: cr.cache.pop("supplier_portal_memo", None))
+        return memo
+
+    def _memoized(self, key, compute):
+        memo = self._request_memo()
+        if memo is None:
+            return compute()
+        if key not in memo:
+            memo[key] = compute()
+        return memo[key]
+
     def get_params(self):
         try:
             params = request.params
@@ -43,6 +92,9 @@ class SupplierPortalBaseService:
         return {}
 
     def validate_token(self, token):
+        return self._memoized(("validate_token", token), lambda: self._validate_token(token))
+
+    def _validate_token(self, token):
         access = request.env["stock.picking.supplier.access"].sudo().search(
             [("access_token", "=", token)],
             limit=1,
@@ -67,6 +119,11 @@ class SupplierPortalBaseService:
             return False
 
     def get_or_create_proforma(self, access):
+        return self._memoized(
+            ("proforma", access.id), lambda: self._get_or_create_proforma(access)
+        )
+
+    def _get_or_create_proforma(self, access):
         po = access.purchase_id
         if not po:
             return False
@@ -175,17 +232,21 @@ class SupplierPortalBaseService:
 
     def partner_from_shipment(self, shipment):
         """Proveedor (partner) de un embarque vía proforma → OC. None si no se puede."""
+        return self._memoized(
+            ("partner", shipment.id), lambda: self._partner_from_shipment(shipment)
+        )
+
+    def _partner_from_shipment(self, shipment):
         try:
             return shipment.proforma_id.purchase_id.partner_id or None
         except Exception:
             return None
 
-    def _partner_origin_name(self, product, partner):
-        """Nombre de origen ligado ESPECÍFICAMENTE a ese proveedor (o su empresa
-        comercial / contacto padre, por si la OC usa un contacto hijo). '' si no hay."""
-        tmpl = product.product_tmpl_id if product else None
-        if not tmpl or not partner or "origin_name_ids" not in tmpl._fields:
-            return ""
+    def _origin_partner_ids(self, partner):
+        """El proveedor, su empresa comercial y su contacto padre (por si la
+        OC usa un contacto hijo)."""
+        if not partner:
+            return set()
         partner_ids = {partner.id}
         commercial = getattr(partner, "commercial_partner_id", False)
         if commercial:
@@ -193,6 +254,15 @@ class SupplierPortalBaseService:
         parent = getattr(partner, "parent_id", False)
         if parent:
             partner_ids.add(parent.id)
+        return partner_ids
+
+    def _partner_origin_name(self, product, partner):
+        """Nombre de origen ligado ESPECÍFICAMENTE a ese proveedor (o su empresa
+        comercial / contacto padre, por si la OC usa un contacto hijo). '' si no hay."""
+        tmpl = product.product_tmpl_id if product else None
+        if not tmpl or not partner or "origin_name_ids" not in tmpl._fields:
+            return ""
+        partner_ids = self._origin_partner_ids(partner)
         matches = tmpl.origin_name_ids.sorted("sequence").filtered(
             lambda o: o.partner_id and o.partner_id.id in partner_ids
         )
@@ -227,6 +297,12 @@ class SupplierPortalBaseService:
 
         Degrada con gracia si el módulo product_origin_names no está instalado.
         """
+        return self._memoized(
+            ("origin_name", product.id if product else 0, partner.id if partner else 0),
+            lambda: self._origin_name_for_partner(product, partner),
+        )
+
+    def _origin_name_for_partner(self, product, partner):
         default = (product.display_name or product.name) if product else ""
         name = self._partner_origin_name(product, partner)
         if name:
@@ -239,6 +315,25 @@ class SupplierPortalBaseService:
             return generic[0].name or default
         return default
 
+    def origin_names_for_products(self, products, partner):
+        """{product_id: nombre} con la misma regla que origin_name_for_partner
+        para VARIOS productos, con una sola lectura de nombres de origen.
+        Cada resultado queda además en el memo de la petición."""
+        partner_ids = self._origin_partner_ids(partner)
+        by_tmpl = origin_names_by_template(products.product_tmpl_id)
+        memo = self._request_memo()
+        result = {}
+        for product in products:
+            default = product.display_name or product.name or ""
+            origins = by_tmpl.get(product.product_tmpl_id.id) or []
+            name = next((n for pid, n in origins if pid and pid in partner_ids), "")
+            if not name and origins:
+                name = next((n or default for pid, n in origins if not pid), default)
+            result[product.id] = name or default
+            if memo is not None:
+                memo[("origin_name", product.id, partner.id if partner else 0)] = result[product.id]
+        return result
+
     def _is_service_product(self, product):
         """Los productos de Servicio no se muestran en el portal del proveedor:
         se descartan por completo. Detección defensiva (tipo de producto,
@@ -300,6 +395,11 @@ class SupplierPortalBaseService:
     def covered_purchase_orders(self, access):
         """POs amparadas por el enlace: las de la factura de carga, o la del
         access clásico. SIEMPRE devuelve recordset."""
+        return self._memoized(
+            ("covered_pos", access.id), lambda: self._covered_purchase_orders(access)
+        )
+
+    def _covered_purchase_orders(self, access):
         try:
             return access._covered_purchase_orders()
         except Exception:
@@ -308,6 +408,11 @@ class SupplierPortalBaseService:
     def ensure_headers_for_access(self, access):
         """Garantiza UNA proforma (PI) por cada PO amparada y las devuelve en
         el orden de las POs. Pre-llena el número de PI capturado en Compras."""
+        return self._memoized(
+            ("headers", access.id), lambda: self._ensure_headers_for_access(access)
+        )
+
+    def _ensure_headers_for_access(self, access):
         pos = self.covered_purchase_orders(access)
         Header = request.env['supplier.proforma.header'].sudo()
         headers = Header
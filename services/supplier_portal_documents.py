@@ -1,12 +1,17 @@
 # -*- coding: utf-8 -*-
 
 import base64
+import csv
 import hashlib
 import io
 import logging
+import os
+import re
 
+from odoo.exceptions import UserError
 from odoo.http import request
 
+from ..models import pl_template, vucem_pdf
 from .supplier_portal_base import SupplierPortalBaseService
 
 _logger = logging.getLogger(__name__)
@@ -44,6 +49,14 @@ class SupplierPortalDocumentsService(SupplierPortalBaseService):
 
     ALL_VALID_DOC_TYPES = SHIPMENT_DOC_TYPES + PROFORMA_DOC_TYPES
 
+    XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    def __init__(self, proforma_service=None):
+        # Servicio que guarda los packings (save_packing): lo inyecta
+        # SupplierPortalProformaService al construirse, porque ese módulo
+        # importa éste. Sin él, un PL subido se guarda solo como documento.
+        self.proforma_service = proforma_service
+
     def serialize_document(self, doc):
         return {
             "id": doc.id,
@@ -99,15 +112,14 @@ class SupplierPortalDocumentsService(SupplierPortalBaseService):
         target_dpi = 300
 
         try:
+            # Página por página: en memoria solo vive la página en curso.
             doc = fitz.open(stream=file_bytes, filetype="pdf")
             output_doc = fitz.open()
+            zoom = target_dpi / 72.0
+            mat = fitz.Matrix(zoom, zoom)
 
             for page_num in range(len(doc)):
-                page = doc[page_num]
-                zoom = target_dpi / 72.0
-                mat = fitz.Matrix(zoom, zoom)
-                pix = page.get_pixmap(matrix=mat, alpha=False)
-
+                pix = doc[page_num].get_pixmap(matrix=mat, alpha=False)
                 img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
 
                 img_bytes = io.BytesIO()
@@ -122,8 +134,11 @@ class SupplierPortalDocumentsService(SupplierPortalBaseService):
             output_doc.close()
             doc.close()
 
-            if len(result) > 3 * 1024 * 1024:
-                compressed = self.compress_pdf_to_max_size(result, fitz, Image, target_dpi)
+            if len(result) > vucem_pdf.MAX_SIZE:
+                # Solo aquí se retienen las páginas: la compresión las
+                # rasteriza una vez desde el original y prueba calidades
+                # sobre ellas.
+                compressed = self.compress_pdf_to_max_size(file_bytes, fitz, Image, target_dpi)
                 if compressed:
                     result = compressed
 
@@ -133,57 +148,42 @@ class SupplierPortalDocumentsService(SupplierPortalBaseService):
             _logger.warning("[Portal] Error normalizando PDF: %s. Se guarda original.", err)
             return file_data_b64, dpi_value
 
-    def compress_pdf_to_max_size(self, pdf_bytes, fitz, Image, target_dpi):
-        max_size = 3 * 1024 * 1024
+    def _rasterize_pdf_pages(self, pdf_bytes, fitz, Image, target_dpi):
+        """Todas las páginas a ``target_dpi`` en RGB. Solo para comprimir un
+        PDF que ya se sabe que pasa de 3 MB."""
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        zoom = target_dpi / 72.0
+        mat = fitz.Matrix(zoom, zoom)
+        page_images = []
+        for page_num in range(len(doc)):
+            pix = doc[page_num].get_pixmap(matrix=mat, alpha=False)
+            page_images.append(Image.frombytes("RGB", [pix.width, pix.height], pix.samples))
+        doc.close()
+        return page_images
+
+    def _compress_page_images(self, page_images, target_dpi):
+        """PDF de máximo 3 MB a partir de páginas ya rasterizadas (una
+        codificación JPEG por página y calidad, un solo armado), o None."""
+        try:
+            result = vucem_pdf.compress_pages(page_images, target_dpi, vucem_pdf.MAX_SIZE)
+        except Exception as err:
+            _logger.warning("[Portal] Error comprimiendo PDF: %s", err)
+            return None
 
-        for quality in [85, 70, 55, 40, 30, 20]:
-            try:
-                doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-                output_doc = fitz.open()
-
-                for page_num in range(len(doc)):
-                    page = doc[page_num]
-                    zoom = target_dpi / 72.0
-                    mat = fitz.Matrix(zoom, zoom)
-                    pix = page.get_pixmap(matrix=mat, alpha=False)
-
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-
-                    jpeg_buf = io.BytesIO()
-                    img.save(jpeg_buf, format="JPEG", quality=quality, optimize=True)
-                    jpeg_buf.seek(0)
-                    img_compressed = Image.open(jpeg_buf)
-
-                    pdf_buf = io.BytesIO()
-                    img_compressed.save(pdf_buf, format="PDF", resolution=target_dpi)
-                    pdf_buf.seek(0)
-
-                    page_pdf = fitz.open(stream=pdf_buf.read(), filetype="pdf")
-                    output_doc.insert_pdf(page_pdf)
-                    page_pdf.close()
-
-                result = output_doc.tobytes()
-                output_doc.close()
-                doc.close()
-
-                if len(result) <= max_size:
-                    _logger.info(
-                        "[Portal] PDF comprimido a %d bytes con quality=%d",
-                        len(result),
-                        quality,
-                    )
-                    return result
+        if not result:
+            _logger.warning("[Portal] No se pudo comprimir PDF a menos de 3MB.")
+            return None
 
-            except Exception as err:
-                _logger.warning(
-                    "[Portal] Error comprimiendo PDF (quality=%d): %s",
-                    quality,
-                    err,
-                )
-                continue
+        _logger.info("[Portal] PDF comprimido a %d bytes", len(result))
+        return result
 
-        _logger.warning("[Portal] No se pudo comprimir PDF a menos de 3MB.")
-        return None
+    def compress_pdf_to_max_size(self, pdf_bytes, fitz, Image, target_dpi):
+        try:
+            page_images = self._rasterize_pdf_pages(pdf_bytes, fitz, Image, target_dpi)
+        except Exception as err:
+            _logger.warning("[Portal] Error rasterizando PDF para comprimir: %s", err)
+            return None
+        return self._compress_page_images(page_images, target_dpi)
 
     # =====================================================================
     #  API LOGIC: DOCUMENTOS
@@ -312,17 +312,230 @@ class SupplierPortalDocumentsService(SupplierPortalBaseService):
         }
 
         record = doc_model.create(vals)
+
+        # Un PL en CSV/XLSX se vuelca además a filas del portal: el proveedor
+        # no tiene que volver a capturarlo en la tabla. Si la lectura falla,
+        # el documento queda guardado igual y se informa el motivo.
+        packing_import = None
+        pl_kind = (
+            self.packing_list_file_kind(file_name, mime_type)
+            if document_type == "packing_list"
+            else None
+        )
+        if pl_kind and self.proforma_service:
+            try:
+                with request.env.cr.savepoint():
+                    packing_import = self.import_packing_list_file(
+                        access,
+                        shipment,
+                        final_file_data,
+                        pl_kind,
+                        packing_number=payload.get("packing_number")
+                        or os.path.splitext(file_name)[0],
+                    )
+            except Exception as e:
+                _logger.exception(
+                    "[Portal] No se pudo importar el PL '%s' del embarque %s.",
+                    file_name, shipment.id,
+                )
+                packing_import = {"success": False, "message": str(e)}
+
         documents = (
             self.serialize_documents_for_scope(proforma_id=proforma.id)
             if is_proforma_doc
             else self.serialize_documents_for_scope(shipment_id=shipment.id)
         )
-        return {
+        result = {
             "success": True,
             "document_id": record.id,
             "document": self.serialize_document(record),
             "documents": documents,
         }
+        if packing_import is not None:
+            result["packing_import"] = packing_import
+        return result
+
+    # =====================================================================
+    #  IMPORTACION DE PACKING LIST (CSV / XLSX)
+    # =====================================================================
+
+    def packing_list_file_kind(self, file_name, mime_type):
+        """'csv' o 'xlsx' si el archivo se puede volcar a filas; None si no
+        (PDF, .xls binario, etc.)."""
+        ext = os.path.splitext((file_name or "").lower())[1]
+        if mime_type == "text/csv" or ext == ".csv":
+            return "csv"
+        if mime_type == self.XLSX_MIME or ext == ".xlsx":
+            return "xlsx"
+        return None
+
+    def _iter_csv_sheets(self, file_bytes, title):
+        """Misma forma que ``pl_template.iter_workbook_sheets``: una sola "hoja" con
+        ``(título, valor B1, filas desde la 4)``. Acepta coma o punto y coma
+        como separador (Excel en español exporta con ';')."""
+        try:
+            text = file_bytes.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            text = file_bytes.decode("latin-1")
+        try:
+            dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        rows = csv.reader(io.StringIO(text), dialect)
+        header = [next(rows, []) or [] for _ in range(3)]
+        b1 = header[0][1] if len(header[0]) > 1 else None
+        yield title, b1, rows
+
+    def _pl_float(self, value):
+        if value in (None, False, ""):
+            return 0.0
+        try:
+            return max(0.0, float(str(value).strip().replace(" ", "").replace(",", ".")))
+        except Exception:
+            return 0.0
+
+    def _pl_text(self, value):
+        if value in (None, False):
+            return ""
+        # openpyxl entrega 12.0 para una celda "12": el folio no lleva decimal.
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value).strip()
+
+    def _pl_products_index(self, access):
+        """Productos amparados por el enlace indexados por código y nombre
+        (minúsculas), para resolver la cabecera B1 ``Nombre (CODIGO)`` y el
+        nombre de la hoja sin buscar en todo el catálogo."""
+        index = {}
+        for po in self.covered_purchase_orders(access):
+            for line in po.order_line:
+                product = line.product_id
+                if line.display_type or not product or self._is_service_product(product):
+                    continue
+                for key in (product.default_code, product.name,
+                            (product.default_code or product.name or "")[:31]):
+                    if key:
+                        index.setdefault(key.strip().lower(), product)
+        return index
+
+    def _pl_sheet_product(self, index, title, b1):
+        header = self._pl_text(b1)
+        candidates = []
+        code = re.search(r"\(([^()]*)\)\s*$", header)
+        if code:
+            candidates.append(code.group(1))
+        candidates.append(header.split("(")[0])
+        candidates.append(title)
+        for key in candidates:
+            product = index.get((key or "").strip().lower())
+            if product:
+                return product
+        return None
+
+    def parse_packing_list_file(self, access, shipment, file_data, kind, file_title=""):
+        """Lee un PL con el layout de la plantilla (B1 = producto, cabeceras
+        en la fila 3, datos desde la 4) y devuelve ``(vals_list, omitidas)``
+        con los valores de ``supplier.shipment.packing.row`` (sin
+        ``packing_id``) y los nombres de hoja que no se pudieron ligar a un
+        producto."""
+        if kind == "xlsx":
+            sheets = pl_template.iter_excel_sheets(file_data)
+        else:
+            sheets = self._iter_csv_sheets(base64.b64decode(file_data), file_title)
+
+        index = self._pl_products_index(access)
+        containers = {
+            (c.container_number or "").strip().upper(): c.id
+            for c in shipment.container_ids
+            if c.container_number
+        }
+
+        vals_list = []
+        skipped = []
+        for title, b1, rows in sheets:
+            product = self._pl_sheet_product(index, title, b1)
+            if not product:
+                skipped.append(title or self._pl_text(b1))
+                continue
+            unit_type = str(product.product_tmpl_id.x_unidad_del_producto or "Placa").strip().capitalize()
+            tipo = "Placa" if unit_type == "Placa" else ("Formato" if unit_type == "Formato" else "Pieza")
+            cols = pl_template.column_index(unit_type)
+
+            for values in rows:
+                def cell(key):
+                    i = cols.get(key)
+                    return values[i] if i is not None and i < len(values) else None
+
+                ancho = self._pl_float(cell("ancho"))
+                alto = self._pl_float(cell("alto"))
+                quantity = self._pl_float(cell("quantity"))
+                if tipo == "Placa" and not (ancho and alto):
+                    continue
+                if tipo != "Placa" and not quantity:
+                    continue
+
+                vals_list.append({
+                    "product_id": product.id,
+                    "container_id": containers.get(self._pl_text(cell("contenedor")).upper(), False),
+                    "tipo": tipo,
+                    "grosor": self._pl_text(cell("grosor")),
+                    "alto": alto,
+                    "ancho": ancho,
+                    "peso": self._pl_float(cell("peso")),
+                    "quantity": quantity,
+                    "bloque": self._pl_text(cell("bloque")),
+                    "numero_placa": self._pl_text(cell("numero_placa")),
+                    "atado": self._pl_text(cell("atado")),
+                    "color": self._pl_text(cell("color")),
+                    "grupo_name": self._pl_text(cell("grupo_name")),
+                    "pedimento": self._pl_text(cell("pedimento")),
+                    "ref_proveedor": self._pl_text(cell("ref_proveedor")),
+                })
+        return vals_list, skipped
+
+    def import_packing_list_file(self, access, shipment, file_data, kind, packing_number=""):
+        """Vuelca un PL CSV/XLSX a un packing del embarque por el mismo camino
+        que el guardado del portal (save_packing): mismas validaciones de
+        filas y contenedores y misma revisión del packing. Si el embarque ya
+        tiene un packing con ese folio, sus filas se REEMPLAZAN por las del
+        archivo: subir dos veces el mismo PL no duplica filas.
+
+        Un rechazo de save_packing se lanza como UserError para que el
+        savepoint del llamador descarte lo que alcanzó a escribir."""
+        vals_list, skipped = self.parse_packing_list_file(
+            access, shipment, file_data, kind, file_title=packing_number,
+        )
+        if not vals_list:
+            return {
+                "success": False,
+                "message": "No se encontraron filas válidas en el archivo.",
+                "skipped_sheets": skipped,
+            }
+
+        packing_number = (packing_number or "").strip()
+        packing = shipment.packing_ids.filtered(
+            lambda pk: packing_number
+            and (pk.packing_number or "").strip() == packing_number
+        )[:1]
+        packing_data = (
+            {"id": packing.id, "packing_number": packing_number}
+            if packing
+            else {"packing_number": packing_number, "scope": "full_shipment"}
+        )
+
+        result = self.proforma_service.save_packing(
+            access.access_token, shipment.id, packing_data, vals_list,
+        )
+        if not result.get("success"):
+            raise UserError(result.get("message") or "No se pudo importar el Packing List.")
+
+        return {
+            "success": True,
+            "packing_id": result["packing_id"],
+            "rows_imported": len(vals_list),
+            "replaced": bool(packing),
+            "skipped_sheets": skipped,
+        }
 
     def delete_document(self, token, document_id):
         access = self.validate_token(token)
@@ -4,6 +4,7 @@ import json
 import logging
 
 from odoo.exceptions import UserError
+from odoo.tools import float_compare
 
 from markupsafe import Markup, escape
 from odoo import fields
@@ -26,7 +27,7 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
     """
 
     def __init__(self):
-        self.documents_service = SupplierPortalDocumentsService()
+        self.documents_service = SupplierPortalDocumentsService(proforma_service=self)
         self.sync_service = SupplierPortalSyncService()
 
     # =====================================================================
@@ -130,13 +131,13 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
 
         return True, "", valid_container_ids
 
-    def compute_packing_derived_flags(self, packing):
-        container_ids = packing.container_ids.ids
-        row_container_ids = packing.row_ids.filtered(lambda row: row.container_id).mapped("container_id").ids
-        row_container_ids = list(dict.fromkeys(row_container_ids))
-
-        all_related_container_ids = list(dict.fromkeys(container_ids + row_container_ids))
-        rows_without_container = packing.row_ids.filtered(lambda row: not row.container_id)
+    def _derive_packing_flags(self, container_ids, row_container_ids):
+        """Banderas de contenedor de un packing a partir de sus contenedores
+        asignados y del container_id de cada fila (False si no tiene), en el
+        orden de las filas."""
+        assigned_row_container_ids = list(dict.fromkeys(cid for cid in row_container_ids if cid))
+        all_related_container_ids = list(dict.fromkeys(list(container_ids) + assigned_row_container_ids))
+        rows_without_container_count = sum(1 for cid in row_container_ids if not cid)
         is_single_container = len(all_related_container_ids) == 1
         is_multi_container = len(all_related_container_ids) > 1
 
@@ -149,15 +150,78 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
 
         return {
             "container_count_derived": len(all_related_container_ids),
-            "row_container_ids": row_container_ids,
+            "row_container_ids": assigned_row_container_ids,
             "all_related_container_ids": all_related_container_ids,
-            "has_rows_without_container": bool(rows_without_container),
-            "rows_without_container_count": len(rows_without_container),
+            "has_rows_without_container": bool(rows_without_container_count),
+            "rows_without_container_count": rows_without_container_count,
             "is_single_container": is_single_container,
             "is_multi_container": is_multi_container,
             "suggested_mode": suggested_mode,
         }
 
+    def _packings_derived_flags(self, packings):
+        """Banderas de todos los ``packings`` con una sola lectura de filas."""
+        if not packings:
+            return {}
+        row_container_ids = {packing.id: [] for packing in packings}
+        rows_data = request.env["supplier.shipment.packing.row"].sudo().search_read(
+            [("packing_id", "in", packings.ids)],
+            ["packing_id", "container_id"],
+            order="packing_id, sequence, id",
+            load=None,
+        )
+        for row in rows_data:
+            row_container_ids[row["packing_id"]].append(row["container_id"] or False)
+        return {
+            packing.id: self._derive_packing_flags(
+                packing.container_ids.ids, row_container_ids[packing.id]
+            )
+            for packing in packings
+        }
+
+    def compute_packing_derived_flags(self, packing):
+        return self._packings_derived_flags(packing)[packing.id]
+
+    def shipment_packing_summary(self, shipment):
+        """
+        Resumen de cobertura de contenedores de un embarque en una sola pasada:
+        banderas por packing (``packings``), contenedores cubiertos por algún
+        packing, contenedores sin packing y packings de alcance específico
+        sin contenedores o con filas fuera de su alcance.
+        """
+        packings = self.sorted_packings(shipment.packing_ids)
+        flags_by_packing = self._packings_derived_flags(packings)
+
+        related_container_ids = set()
+        unscoped_packing_ids = []
+        out_of_scope_packing_ids = []
+        for packing in packings:
+            flags = flags_by_packing[packing.id]
+            related_container_ids.update(flags["all_related_container_ids"])
+            if packing.scope != "specific_containers":
+                continue
+            packing_container_ids = set(packing.container_ids.ids)
+            if not packing_container_ids:
+                unscoped_packing_ids.append(packing.id)
+            elif set(flags["row_container_ids"]) - packing_container_ids:
+                out_of_scope_packing_ids.append(packing.id)
+
+        return {
+            "packings": flags_by_packing,
+            "related_container_ids": related_container_ids,
+            "containers_without_packing": [
+                cid for cid in shipment.container_ids.ids if cid not in related_container_ids
+            ],
+            "has_multi_container_packings": any(
+                flags["is_multi_container"] for flags in flags_by_packing.values()
+            ),
+            "has_packings_without_container": any(
+                flags["has_rows_without_container"] for flags in flags_by_packing.values()
+            ),
+            "unscoped_packing_ids": unscoped_packing_ids,
+            "out_of_scope_packing_ids": out_of_scope_packing_ids,
+        }
+
     # =====================================================================
     #  BALANCE DE CANTIDADES
     # =====================================================================
@@ -171,11 +235,9 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
         pos = self.covered_purchase_orders(access) if access else proforma.purchase_id
         ordered_map = self.sync_service._pos_ordered_qty_map(pos)
 
-        current_map = {}
-        for shipment in proforma.shipment_ids:
-            ship_map = self.sync_service._shipment_qty_map(shipment)
-            for pid, qty in ship_map.items():
-                current_map[pid] = current_map.get(pid, 0.0) + qty
+        current_map = self.sync_service._sum_by_product(
+            self.sync_service._shipments_qty_aggregate(proforma.shipment_ids.ids)
+        )
 
         product_line_map = {}
         for line in pos.order_line.filtered(lambda l: not l.display_type and l.product_id):
@@ -356,41 +418,93 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
     #  SERIALIZACION
     # =====================================================================
 
-    def serialize_packing_for_response(self, packing):
+    PACKING_ROW_COLUMNS = [
+        "sequence", "product_id", "container_id", "tipo", "grosor", "alto",
+        "ancho", "peso", "quantity", "bloque", "numero_placa", "atado",
+        "color", "grupo_name", "pedimento", "ref_proveedor", "area_m2",
+        "pi_header_id", "pi_manual",
+    ]
+
+    def _row_ids_with_image(self, row_ids):
+        """Filas con foto, por existencia del adjunto (sin leer el binario)."""
+        if not row_ids:
+            return set()
+        attachments = request.env["ir.attachment"].sudo().search_read(
+            [
+                ("res_model", "=", "supplier.shipment.packing.row"),
+                ("res_field", "=", "image"),
+                ("res_id", "in", list(row_ids)),
+            ],
+            ["res_id"],
+        )
+        return {att["res_id"] for att in attachments}
+
+    def serialize_packing_for_response(self, packing, derived=None):
         """
         LIVE-PORTAL-005:
         Payload completo para reconciliar un Packing List recién creado o guardado
         sin depender únicamente de un reload posterior del portal.
+
+        Las filas se leen en columna (un search_read por packing); contenedor,
+        PI y nombre de origen salen de mapas por id y la foto se detecta por
+        la existencia del adjunto. ``derived`` son las banderas de contenedor
+        ya calculadas (ver ``shipment_packing_summary``); si no se reciben se
+        derivan de las mismas filas leídas.
         """
-        derived = self.compute_packing_derived_flags(packing)
-
-        rows_payload = []
-        for row in packing.row_ids.sorted("sequence"):
-            rows_payload.append({
-                "id": row.id,
-                "product_id": row.product_id.id,
-                "product_name": self.origin_name_for_partner(row.product_id, self.partner_from_shipment(packing.shipment_id)),
-                "container_id": row.container_id.id if row.container_id else False,
-                "container_number": row.container_id.container_number if row.container_id else "",
-                "tipo": row.tipo or "Placa",
-                "grosor": row.grosor or "",
-                "alto": row.alto,
-                "ancho": row.ancho,
-                "peso": row.peso,
-                "quantity": row.quantity,
-                "bloque": row.bloque or "",
-                "numero_placa": row.numero_placa or "",
-                "atado": row.atado or "",
-                "color": row.color or "",
-                "grupo_name": row.grupo_name or "",
-                "pedimento": row.pedimento or "",
-                "ref_proveedor": row.ref_proveedor or "",
-                "area_m2": row.area_m2,
-                "has_image": bool(row.image),
-                "pi_header_id": row.pi_header_id.id if row.pi_header_id else False,
-                "pi_number": row.pi_header_id.proforma_number if row.pi_header_id else "",
-                "pi_manual": bool(row.pi_manual),
-            })
+        rows_data = request.env["supplier.shipment.packing.row"].sudo().search_read(
+            [("packing_id", "=", packing.id)],
+            self.PACKING_ROW_COLUMNS,
+            order="sequence, id",
+            load=None,
+        )
+        container_ids = {r["container_id"] for r in rows_data if r["container_id"]}
+        pi_ids = {r["pi_header_id"] for r in rows_data if r["pi_header_id"]}
+        product_ids = {r["product_id"] for r in rows_data if r["product_id"]}
+        container_numbers = {
+            c["id"]: c["container_number"] or ""
+            for c in request.env["supplier.shipment.container"].sudo().browse(
+                list(container_ids)).read(["container_number"])
+        }
+        pi_numbers = {
+            h["id"]: h["proforma_number"] or ""
+            for h in request.env["supplier.proforma.header"].sudo().browse(
+                list(pi_ids)).read(["proforma_number"])
+        }
+        origin_names = self.origin_names_for_products(
+            request.env["product.product"].sudo().browse(list(product_ids)),
+            self.partner_from_shipment(packing.shipment_id),
+        )
+        with_image = self._row_ids_with_image([r["id"] for r in rows_data])
+        if derived is None:
+            derived = self._derive_packing_flags(
+                packing.container_ids.ids, [r["container_id"] or False for r in rows_data]
+            )
+
+        rows_payload = [{
+            "id": r["id"],
+            "product_id": r["product_id"],
+            "product_name": origin_names.get(r["product_id"], ""),
+            "container_id": r["container_id"] or False,
+            "container_number": container_numbers.get(r["container_id"], ""),
+            "tipo": r["tipo"] or "Placa",
+            "grosor": r["grosor"] or "",
+            "alto": r["alto"],
+            "ancho": r["ancho"],
+            "peso": r["peso"],
+            "quantity": r["quantity"],
+            "bloque": r["bloque"] or "",
+            "numero_placa": r["numero_placa"] or "",
+            "atado": r["atado"] or "",
+            "color": r["color"] or "",
+            "grupo_name": r["grupo_name"] or "",
+            "pedimento": r["pedimento"] or "",
+            "ref_proveedor": r["ref_proveedor"] or "",
+            "area_m2": r["area_m2"],
+            "has_image": r["id"] in with_image,
+            "pi_header_id": r["pi_header_id"] or False,
+            "pi_number": pi_numbers.get(r["pi_header_id"], ""),
+            "pi_manual": bool(r["pi_manual"]),
+        } for r in rows_data]
 
         return {
             "id": packing.id,
@@ -399,7 +513,8 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
             "scope": packing.scope or "full_shipment",
             "container_ids": packing.container_ids.ids,
             "structure_json": packing.structure_json or "",
-            "row_count": packing.row_count,
+            "revision": packing.revision or 0,
+            "row_count": len(rows_data),
             "rows": rows_payload,
             "container_count_derived": derived["container_count_derived"],
             "row_container_ids": derived["row_container_ids"],
@@ -534,10 +649,14 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
         except Exception:
             return [], []
 
-    def serialize_proforma(self, header):
+    def serialize_proforma(self, header, shipment_records=None):
+        """Payload completo de la proforma. Con ``shipment_records`` solo se
+        serializan esos embarques (reload parcial por revisión)."""
         shipments = []
+        if shipment_records is None:
+            shipment_records = header.shipment_ids
 
-        for shipment in self.sorted_shipments(header.shipment_ids):
+        for shipment in self.sorted_shipments(shipment_records):
             picking = self._get_shipment_picking(shipment)
             shipment_products = self.sync_service.build_products_payload_for_shipment(shipment)
 
@@ -565,22 +684,13 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
                 "is_multi_container": len(invoice.container_ids.ids) > 1,
             } for invoice in shipment.invoice_ids]
 
+            summary = self.shipment_packing_summary(shipment)
             packings = [
-                self.serialize_packing_for_response(packing)
+                self.serialize_packing_for_response(packing, derived=summary["packings"][packing.id])
                 for packing in self.sorted_packings(shipment.packing_ids)
             ]
 
             shipment_container_ids = set(shipment.container_ids.ids)
-            packing_related_container_ids = set()
-            containers_without_packing = []
-
-            for packing in self.sorted_packings(shipment.packing_ids):
-                derived = self.compute_packing_derived_flags(packing)
-                packing_related_container_ids.update(derived["all_related_container_ids"])
-
-            for container in shipment.container_ids:
-                if container.id not in packing_related_container_ids:
-                    containers_without_packing.append(container.id)
 
             block_images = []
             if hasattr(shipment, "block_image_ids"):
@@ -623,9 +733,9 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
                 "containers": containers,
                 "block_images": block_images,
                 "voyage_id": shipment.voyage_id.id if shipment.voyage_id else False,
-                "containers_without_packing": containers_without_packing,
-                "has_multi_container_packings": any(item["is_multi_container"] for item in packings),
-                "has_packings_without_container": any(item["has_rows_without_container"] for item in packings),
+                "containers_without_packing": summary["containers_without_packing"],
+                "has_multi_container_packings": summary["has_multi_container_packings"],
+                "has_packings_without_container": summary["has_packings_without_container"],
                 "all_container_ids": list(shipment_container_ids),
                 "documents": shipment_documents,
                 "picking_id": picking.id if picking else False,
@@ -648,6 +758,7 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
             "incoterm": header.incoterm or "",
             "general_notes": header.general_notes or "",
             "status": header.status or "draft",
+            "revision": self.portal_revision(header),
             "shipments": shipments,
             "global_documents": [],
             "progress": progress,
@@ -678,6 +789,8 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
         headers = self.ensure_headers_for_access(access)
         products = self.build_products_payload_from_purchase(covered_pos)
         proforma = self.get_or_create_proforma(access)
+        if proforma:
+            self.sync_service.flush_shipment_sync(proforma.shipment_ids)
         proforma_data = self.serialize_proforma(proforma) if proforma else {}
 
         header_by_po = {h.purchase_id.id: h for h in headers}
@@ -1049,7 +1162,7 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
             to_delete.unlink()
 
         self.sync_service.sync_shipment_header_to_picking(shipment)
-        self.sync_service.sync_shipment(shipment)
+        self.sync_service.schedule_shipment_sync(shipment)
 
         containers_payload = [{
             "id": container.id,
@@ -1348,74 +1461,16 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
             stale_ids_detected = False
             for idx, row in enumerate(rows, start=1):
                 row_id = self.safe_int(row.get("id"), 0)
-                row_container_id = self.safe_int(row.get("container_id"), 0)
                 client_id = row.get("_client_id") or row.get("client_id") or row.get("_id") or ""
 
-                if row_container_id and row_container_id not in shipment_container_ids:
-                    return {
-                        "success": False,
-                        "message": "La fila %s contiene un contenedor inválido para este embarque." % idx,
-                    }
-
-                if scope == "specific_containers" and row_container_id and row_container_id not in packing_container_ids:
-                    return {
-                        "success": False,
-                        "message": "La fila %s contiene un contenedor fuera del alcance del packing." % idx,
-                    }
-
-                row_vals = {
-                    "packing_id": packing.id,
-                    "sequence": sequence,
-                    "product_id": self.safe_int(row.get("product_id"), 0),
-                    "container_id": row_container_id or False,
-                    "tipo": row.get("tipo", "Placa"),
-                    "grosor": row.get("grosor", ""),
-                    # max(0,…): un negativo del proveedor (typo "-2.8") restaba
-                    # del total declarado y de product_qty (lo que se PAGA), y
-                    # -2 × -3 fabricaba 6 m² fantasma. Dimensión inválida = 0
-                    # (las filas en cero ya las tratan los blindajes/import).
-                    "alto": max(0.0, self.safe_float(row.get("alto", 0))),
-                    "ancho": max(0.0, self.safe_float(row.get("ancho", 0))),
-                    "peso": max(0.0, self.safe_float(row.get("peso", 0))),
-                    "quantity": max(0.0, self.safe_float(row.get("quantity", 0))),
-                    "bloque": row.get("bloque", ""),
-                    "numero_placa": row.get("numero_placa", ""),
-                    "atado": row.get("atado", ""),
-                    "color": row.get("color", ""),
-                    "grupo_name": row.get("grupo_name", ""),
-                    "pedimento": row.get("pedimento", ""),
-                    "ref_proveedor": row.get("ref_proveedor", ""),
-                }
-
-                # Asignación MANUAL de PI por fila (misma mecánica que el
-                # contenedor). Si no viene, la fila queda para el FIFO.
-                if "pi_header_id" in row:
-                    pi_header_id = self.safe_int(row.get("pi_header_id"), 0)
-                    if pi_header_id and pi_header_id not in allowed_header_ids:
-                        return {
-                            "success": False,
-                            "message": "La fila %s contiene una PI que no pertenece a esta carga." % idx,
-                        }
-                    # La PI elegida debe CONTENER el producto de la fila: una
-                    # PI sin ese material provocaría un reparto imposible.
-                    if pi_header_id and row_vals.get("product_id"):
-                        pi_header = request.env["supplier.proforma.header"].sudo().browse(pi_header_id)
-                        pi_po = pi_header.purchase_id
-                        has_product = pi_po and any(
-                            not l.display_type
-                            and l.product_id.id == row_vals["product_id"]
-                            for l in pi_po.order_line
-                        )
-                        if not has_product:
-                            return {
-                                "success": False,
-                                "message": "La fila %s asigna una PI que no contiene ese producto." % idx,
-                            }
-                    row_vals["pi_header_id"] = pi_header_id or False
-                    row_vals["pi_manual"] = bool(pi_header_id)
-
-                if not row_vals["product_id"]:
-                    return {"success": False, "message": "Todas las filas deben tener producto."}
+                row_vals = self._packing_row_vals_from_payload(row)
+                row_vals.update({"packing_id": packing.id, "sequence": sequence})
+                error = self._check_packing_row_vals(
+                    row, row_vals, idx, scope,
+                    shipment_container_ids, packing_container_ids, allowed_header_ids,
+                )
+                if error:
+                    return {"success": False, "message": error}
 
                 # Resolución del registro destino (SIN escrituras todavía).
                 row_record = None
@@ -1507,42 +1562,67 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
                         )
 
             # ---- PASADA 2: aplicar (validación completa ya aprobada) ----
+            # Upsert por diferencias: cada fila existente escribe SOLO los
+            # campos que cambiaron; escrituras con los mismos valores se
+            # agrupan en un solo write() y las altas van en un create()
+            # masivo. Un autosave donde se editaron 3 celdas de un PL de 600
+            # filas hace 3 escrituras, no 600.
+            grouped_writes = {}
+            pending_creates = []
             for row_vals, row_record, client_id, _stale_row_id in prepared:
-                if row_record:
-                    # BLINDAJE ANTI-BORRADO (2): si la fila YA tiene medidas
-                    # capturadas en el servidor y el guardado llega con TODO en
-                    # cero (alto, ancho y cantidad), es el patrón de un autosave
-                    # con estado reiniciado — no una corrección legítima (para
-                    # quitar una fila está el botón de eliminar fila). Se
-                    # conservan las medidas del servidor y se registra en log.
-                    incoming_empty = (
-                        not row_vals.get("alto")
-                        and not row_vals.get("ancho")
-                        and not row_vals.get("quantity")
-                    )
-                    server_has_data = bool(
-                        row_record.alto or row_record.ancho or row_record.quantity
-                    )
-                    if incoming_empty and server_has_data:
-                        _logger.warning(
-                            "[Portal][GUARD] Fila %s del packing %s llegó SIN "
-                            "medidas (servidor: alto=%s ancho=%s qty=%s). Se "
-                            "conservan los valores del servidor.",
-                            row_record.id, packing.id,
-                            row_record.alto, row_record.ancho, row_record.quantity,
-                        )
-                        for key in ("alto", "ancho", "quantity", "peso"):
-                            row_vals.pop(key, None)
-                    row_record.write(row_vals)
-                else:
-                    row_record = row_model.create(row_vals)
+                response_entry = {"client_id": str(client_id or ""), "id": False, "has_image": False}
+                saved_rows_response.append(response_entry)
+                if not row_record:
+                    pending_creates.append((response_entry, row_vals))
+                    continue
 
+                # BLINDAJE ANTI-BORRADO (2): si la fila YA tiene medidas
+                # capturadas en el servidor y el guardado llega con TODO en
+                # cero (alto, ancho y cantidad), es el patrón de un autosave
+                # con estado reiniciado — no una corrección legítima (para
+                # quitar una fila está el botón de eliminar fila). Se
+                # conservan las medidas del servidor y se registra en log.
+                incoming_empty = (
+                    not row_vals.get("alto")
+                    and not row_vals.get("ancho")
+                    and not row_vals.get("quantity")
+                )
+                server_has_data = bool(
+                    row_record.alto or row_record.ancho or row_record.quantity
+                )
+                if incoming_empty and server_has_data:
+                    _logger.warning(
+                        "[Portal][GUARD] Fila %s del packing %s llegó SIN "
+                        "medidas (servidor: alto=%s ancho=%s qty=%s). Se "
+                        "conservan los valores del servidor.",
+                        row_record.id, packing.id,
+                        row_record.alto, row_record.ancho, row_record.quantity,
+                    )
+                    for key in ("alto", "ancho", "quantity", "peso"):
+                        row_vals.pop(key, None)
+
+                changes = self._packing_row_changes(row_record, row_vals)
+                if changes:
+                    grouped_writes.setdefault(
+                        tuple(sorted(changes.items())), []
+                    ).append(row_record.id)
+                response_entry["id"] = row_record.id
                 incoming_ids.add(row_record.id)
-                saved_rows_response.append({
-                    "client_id": str(client_id or ""),
-                    "id": row_record.id,
-                    "has_image": bool(row_record.image),
-                })
+
+            for changes, ids in grouped_writes.items():
+                row_model.browse(ids).write(dict(changes))
+
+            with_image = self._row_ids_with_image(
+                [entry["id"] for entry in saved_rows_response if entry["id"]]
+            )
+            for entry in saved_rows_response:
+                entry["has_image"] = entry["id"] in with_image
+
+            if pending_creates:
+                created = row_model.create([vals for _entry, vals in pending_creates])
+                for (response_entry, _vals), record in zip(pending_creates, created):
+                    response_entry["id"] = record.id
+                    incoming_ids.add(record.id)
 
             # ---- PASADA 3: borrar faltantes, con freno ante desincronía ----
             rows_to_delete = packing.row_ids.filtered(lambda rec: rec.id not in incoming_ids)
@@ -1568,11 +1648,28 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
         # AUTO-PL-002:
         # El PL se guarda automáticamente aunque falten fotos por bloque.
         # La exigencia final de fotos se mantiene en complete_proforma().
-        self.sync_service.sync_shipment(shipment)
+        self.sync_service.schedule_shipment_sync(shipment)
+
+        revision = self._bump_packing_revision(packing)
+
+        return {
+            "success": True,
+            "packing_id": packing.id,
+            "revision": revision,
+            "row_ids": packing.row_ids.ids,
+            "rows": saved_rows_response,
+            "balance_warnings": self._packing_balance_warnings(shipment),
+            # LIVE-PORTAL-005:
+            # Se devuelve el objeto serializado para que el frontend pueda
+            # reconciliar la UI optimista aun si el reload posterior tarda.
+            "packing": self.serialize_packing_for_response(packing),
+            "progress": self.compute_progress(proforma),
+        }
 
-        # Aviso de saldo (NO bloqueante): si lo capturado supera lo pedido en
-        # las PO/PI amparadas, se informa pero se permite guardar (el exceso
-        # embarcado es una realidad operativa que se cobra aparte).
+    def _packing_balance_warnings(self, shipment):
+        """Aviso de saldo (NO bloqueante): si lo capturado supera lo pedido en
+        las PO/PI amparadas, se informa pero se permite guardar (el exceso
+        embarcado es una realidad operativa que se cobra aparte)."""
         balance_warnings = []
         try:
             remaining = self.sync_service._remaining_qty_map_for_shipment(shipment)
@@ -1593,20 +1690,283 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
                     )
         except Exception:
             _logger.exception("[Portal] No se pudo calcular el aviso de saldo PL.")
+        return balance_warnings
+
+    def _bump_packing_revision(self, packing, expected=None):
+        """Incrementa la revisión del packing y devuelve la nueva. Con
+        ``expected`` es un compare-and-set: si otra sesión ya guardó, no
+        toca nada y devuelve None. El UPDATE deja la fila bloqueada hasta el
+        commit, así dos autosaves sobre la misma revisión no se pisan."""
+        if expected is None:
+            request.env.cr.execute(
+                """
+                UPDATE supplier_shipment_packing
+                   SET revision = COALESCE(revision, 0) + 1
+                 WHERE id = %s
+             RETURNING revision
+                """,
+                (packing.id,),
+            )
+        else:
+            request.env.cr.execute(
+                """
+                UPDATE supplier_shipment_packing
+                   SET revision = COALESCE(revision, 0) + 1
+                 WHERE id = %s AND COALESCE(revision, 0) = %s
+             RETURNING revision
+                """,
+                (packing.id, expected),
+            )
+        res = request.env.cr.fetchone()
+        packing.invalidate_recordset(["revision"])
+        return res[0] if res else None
+
+    def save_packing_delta(self, token, packing_id, revision, inserted=None, updated=None, deleted=None):
+        """Autosave por DELTA: solo filas insertadas, modificadas (con las
+        llaves que cambiaron) y borradas, contra la revisión del packing que
+        el portal tiene cargada. Una revisión vieja se rechaza con
+        ``stale=True`` para que el portal recargue o haga un guardado
+        completo con save_packing; los blindajes anti-borrado de
+        save_packing aplican igual."""
+        access = self.validate_token(token)
+        if not access:
+            return {"success": False, "message": "Token inválido."}
+
+        proforma = self.get_or_create_proforma(access)
+        packing = request.env["supplier.shipment.packing"].sudo().browse(self.safe_int(packing_id))
+        if not packing.exists() or not self.belongs_to_proforma(proforma, packing=packing):
+            return {"success": False, "message": "Packing no encontrado o no autorizado."}
+
+        shipment = packing.shipment_id
+        row_model = request.env["supplier.shipment.packing.row"].sudo()
+        inserted = inserted or []
+        updated = updated or []
+        deleted = self.normalize_id_list(deleted)
+
+        current_revision = packing.revision or 0
+        stale = {
+            "success": False,
+            "stale": True,
+            "revision": current_revision,
+            "message": "El packing cambió en el servidor. Recargue antes de seguir capturando.",
+        }
+        if self.safe_int(revision, -1) != current_revision:
+            return stale
+        if not (inserted or updated or deleted):
+            return {"success": True, "packing_id": packing.id, "revision": current_revision, "rows": []}
+
+        existing_rows = {row.id: row for row in packing.row_ids}
+        updated_ids = [self.safe_int(row.get("id"), 0) for row in updated]
+        # Con la revisión vigente, un id que no vive en este packing no es
+        # estado viejo del navegador sino un delta incoherente: se rechaza
+        # completo (el guardado completo de save_packing sabe re-emparejar).
+        unknown_ids = [rid for rid in updated_ids + deleted if rid not in existing_rows]
+        if unknown_ids:
+            _logger.warning(
+                "[Portal][GUARD] Delta del packing %s con filas ajenas %s: se rechaza.",
+                packing.id, unknown_ids,
+            )
+            return stale
+
+        # BLINDAJE ANTI-BORRADO (1): vaciar el packing por autosave nunca es
+        # una captura legítima (borrar el PL tiene su propio endpoint).
+        if deleted and not inserted and len(set(deleted)) >= len(existing_rows):
+            _logger.warning(
+                "[Portal][GUARD] Delta del packing %s borraría sus %s filas. Se IGNORA.",
+                packing.id, len(existing_rows),
+            )
+            return {
+                "success": False,
+                "message": "Para eliminar el Packing List completo use la opción de eliminar packing.",
+            }
+
+        scope = packing.scope or "full_shipment"
+        shipment_container_ids = set(shipment.container_ids.ids)
+        packing_container_ids = set(packing.container_ids.ids)
+        allowed_header_ids = set(self.ensure_headers_for_access(access).ids)
+
+        # ---- PASADA 1: validar TODO antes de escribir ----
+        grouped_writes = {}
+        response_rows = []
+        for idx, (row, row_id) in enumerate(zip(updated, updated_ids), start=1):
+            row_record = existing_rows[row_id]
+            row_vals = self._packing_row_vals_from_payload(row, partial=True)
+            if "sequence" in row:
+                row_vals["sequence"] = self.safe_int(row.get("sequence"), row_record.sequence)
+            error = self._check_packing_row_vals(
+                row, row_vals, idx, scope,
+                shipment_container_ids, packing_container_ids, allowed_header_ids,
+                product_id=row_record.product_id.id,
+            )
+            if error:
+                return {"success": False, "message": error}
+
+            # BLINDAJE ANTI-BORRADO (2): mismas reglas que save_packing sobre
+            # el resultado de aplicar el delta a la fila del servidor.
+            incoming_empty = not any(
+                row_vals.get(key, row_record[key]) for key in ("alto", "ancho", "quantity")
+            )
+            if incoming_empty and (row_record.alto or row_record.ancho or row_record.quantity):
+                _logger.warning(
+                    "[Portal][GUARD] Delta: fila %s del packing %s quedaría SIN "
+                    "medidas. Se conservan los valores del servidor.",
+                    row_record.id, packing.id,
+                )
+                for key in ("alto", "ancho", "quantity", "peso"):
+                    row_vals.pop(key, None)
+
+            changes = self._packing_row_changes(row_record, row_vals)
+            if changes:
+                grouped_writes.setdefault(tuple(sorted(changes.items())), []).append(row_record.id)
+            response_rows.append({
+                "client_id": str(row.get("_client_id") or row.get("client_id") or ""),
+                "id": row_record.id,
+            })
+
+        next_sequence = max([r.sequence for r in existing_rows.values()] or [0]) + 10
+        create_vals = []
+        for idx, row in enumerate(inserted, start=len(updated) + 1):
+            row_vals = self._packing_row_vals_from_payload(row)
+            row_vals.update({
+                "packing_id": packing.id,
+                "sequence": self.safe_int(row.get("sequence"), 0) or next_sequence,
+            })
+            next_sequence = max(next_sequence, row_vals["sequence"]) + 10
+            error = self._check_packing_row_vals(
+                row, row_vals, idx, scope,
+                shipment_container_ids, packing_container_ids, allowed_header_ids,
+            )
+            if error:
+                return {"success": False, "message": error}
+            create_vals.append(row_vals)
+
+        # ---- PASADA 2: tomar la revisión y aplicar ----
+        new_revision = self._bump_packing_revision(packing, current_revision)
+        if new_revision is None:
+            stale["revision"] = packing.revision or 0
+            return stale
+
+        for changes, ids in grouped_writes.items():
+            row_model.browse(ids).write(dict(changes))
+        if create_vals:
+            created = row_model.create(create_vals)
+            for row, record in zip(inserted, created):
+                response_rows.append({
+                    "client_id": str(row.get("_client_id") or row.get("client_id") or ""),
+                    "id": record.id,
+                })
+        if deleted:
+            row_model.browse(deleted).unlink()
+
+        self.sync_service.schedule_shipment_sync(shipment)
 
         return {
             "success": True,
             "packing_id": packing.id,
-            "row_ids": packing.row_ids.ids,
-            "rows": saved_rows_response,
-            "balance_warnings": balance_warnings,
-            # LIVE-PORTAL-005:
-            # Se devuelve el objeto serializado para que el frontend pueda
-            # reconciliar la UI optimista aun si el reload posterior tarda.
-            "packing": self.serialize_packing_for_response(packing),
-            "progress": self.compute_progress(proforma),
+            "revision": new_revision,
+            "rows": response_rows,
+            "deleted_ids": deleted,
+            "row_count": len(packing.row_ids),
+            "balance_warnings": self._packing_balance_warnings(shipment),
         }
 
+    PACKING_ROW_TEXT_FIELDS = (
+        "tipo", "grosor", "bloque", "numero_placa", "atado", "color",
+        "grupo_name", "pedimento", "ref_proveedor",
+    )
+    PACKING_ROW_MEASURE_FIELDS = ("alto", "ancho", "peso", "quantity")
+    # Decimales para comparar floats sin ``digits`` propios (las medidas de
+    # la fila): la misma tolerancia de 1e-4 del aviso de saldo.
+    PACKING_ROW_FLOAT_DIGITS = 4
+
+    def _packing_row_vals_from_payload(self, row, partial=False):
+        """Valores de ``supplier.shipment.packing.row`` desde una fila del
+        portal. Con ``partial`` solo se toman las llaves presentes (delta)."""
+        vals = {}
+        if not partial or "product_id" in row:
+            vals["product_id"] = self.safe_int(row.get("product_id"), 0)
+        if not partial or "container_id" in row:
+            vals["container_id"] = self.safe_int(row.get("container_id"), 0) or False
+        for key in self.PACKING_ROW_TEXT_FIELDS:
+            if not partial or key in row:
+                vals[key] = row.get(key, "Placa" if key == "tipo" else "")
+        # max(0,…): un negativo del proveedor (typo "-2.8") restaba del total
+        # declarado y de product_qty (lo que se PAGA), y -2 × -3 fabricaba
+        # 6 m² fantasma. Dimensión inválida = 0 (las filas en cero ya las
+        # tratan los blindajes/import).
+        for key in self.PACKING_ROW_MEASURE_FIELDS:
+            if not partial or key in row:
+                vals[key] = max(0.0, self.safe_float(row.get(key, 0)))
+        return vals
+
+    def _check_packing_row_vals(self, row, row_vals, idx, scope,
+                                shipment_container_ids, packing_container_ids,
+                                allowed_header_ids, product_id=None):
+        """Valida contenedor, PI manual y producto de una fila. Devuelve el
+        mensaje de error o None; deja ``pi_header_id``/``pi_manual`` en
+        ``row_vals`` cuando la fila trae la PI."""
+        row_container_id = row_vals.get("container_id") or 0
+        if row_container_id and row_container_id not in shipment_container_ids:
+            return "La fila %s contiene un contenedor inválido para este embarque." % idx
+
+        if scope == "specific_containers" and row_container_id and row_container_id not in packing_container_ids:
+            return "La fila %s contiene un contenedor fuera del alcance del packing." % idx
+
+        product_id = row_vals.get("product_id", product_id)
+
+        # Asignación MANUAL de PI por fila (misma mecánica que el
+        # contenedor). Si no viene, la fila queda para el FIFO.
+        if "pi_header_id" in row:
+            pi_header_id = self.safe_int(row.get("pi_header_id"), 0)
+            if pi_header_id and pi_header_id not in allowed_header_ids:
+                return "La fila %s contiene una PI que no pertenece a esta carga." % idx
+            # La PI elegida debe CONTENER el producto de la fila: una
+            # PI sin ese material provocaría un reparto imposible.
+            if pi_header_id and product_id:
+                pi_header = request.env["supplier.proforma.header"].sudo().browse(pi_header_id)
+                pi_po = pi_header.purchase_id
+                has_product = pi_po and any(
+                    not l.display_type
+                    and l.product_id.id == product_id
+                    for l in pi_po.order_line
+                )
+                if not has_product:
+                    return "La fila %s asigna una PI que no contiene ese producto." % idx
+            row_vals["pi_header_id"] = pi_header_id or False
+            row_vals["pi_manual"] = bool(pi_header_id)
+
+        if not product_id:
+            return "Todas las filas deben tener producto."
+        return None
+
+    def _packing_row_changes(self, record, vals):
+        """Subconjunto de ``vals`` que difiere de lo guardado en ``record``,
+        normalizando vacíos (False/None/"") y many2one a id. Los floats se
+        comparan con ``float_compare`` a los decimales del campo: 3.18
+        parseado en el navegador no es una edición de 3.18 guardado."""
+        changes = {}
+        for name, value in vals.items():
+            field = record._fields[name]
+            current = record[name]
+            if field.type == "many2one":
+                current, value = current.id or False, value or False
+            elif field.type == "float":
+                current, value = current or 0.0, value or 0.0
+                digits = field.get_digits(record.env)
+                if not float_compare(
+                    current, value,
+                    precision_digits=digits[1] if digits else self.PACKING_ROW_FLOAT_DIGITS,
+                ):
+                    continue
+            elif field.type == "integer":
+                current, value = current or 0, value or 0
+            elif field.type in ("char", "text", "selection"):
+                current = current or ""
+                value = "" if value in (None, False) else str(value)
+            if current != value:
+                changes[name] = value
+        return changes
+
     def delete_packing(self, token, packing_id):
         access = self.validate_token(token)
         if not access:
@@ -1619,7 +1979,7 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
 
         shipment = packing.shipment_id
         packing.unlink()
-        self.sync_service.sync_shipment(shipment)
+        self.sync_service.schedule_shipment_sync(shipment)
         return {"success": True}
 
     # =====================================================================
@@ -1672,22 +2032,19 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
                     }
 
         for shipment in proforma.shipment_ids:
+            summary = self.shipment_packing_summary(shipment)
             for packing in self.sorted_packings(shipment.packing_ids):
-                if packing.scope == "specific_containers" and not packing.container_ids:
+                if packing.id in summary["unscoped_packing_ids"]:
                     return {
                         "success": False,
                         "message": "Existe un packing con alcance a contenedores específicos pero sin contenedores asignados.",
                     }
 
-                if packing.scope == "specific_containers":
-                    invalid_rows = packing.row_ids.filtered(
-                        lambda row: row.container_id and row.container_id.id not in packing.container_ids.ids
-                    )
-                    if invalid_rows:
-                        return {
-                            "success": False,
-                            "message": "Existe un packing con filas usando contenedores fuera de su alcance.",
-                        }
+                if packing.id in summary["out_of_scope_packing_ids"]:
+                    return {
+                        "success": False,
+                        "message": "Existe un packing con filas usando contenedores fuera de su alcance.",
+                    }
 
             # Compra nacional: no se exige fotografía por bloque. Usuario interno
             # con sesión activa: también puede saltarse la validación.
@@ -1978,7 +2335,30 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
             proforma.write({"portal_overall_pct": pct})
         return {"success": True, "percent": pct}
 
-    def reload_proforma(self, token):
+    def portal_revision(self, header):
+        """Revisión que el portal guarda y devuelve en el reload: la de la
+        cabecera y la de cada embarque (``{"proforma": n, "shipments":
+        {"<id>": n}}``)."""
+        shipments = request.env["supplier.shipment"].sudo().search_read(
+            [("proforma_id", "=", header.id)], ["portal_revision"], load=None,
+        )
+        return {
+            "proforma": header.portal_revision or 0,
+            "shipments": {str(row["id"]): row["portal_revision"] or 0 for row in shipments},
+        }
+
+    def reload_proforma(self, token, revision=None):
+        """
+        Reload del portal. Si el cliente manda la ``revision`` que ya tiene
+        (ver ``portal_revision``) y la cabecera no cambió:
+        - ningún embarque cambió: ``not_modified``;
+        - si no, solo los embarques cambiados (``partial``), más
+          ``shipment_ids`` vigentes para detectar bajas.
+        En ambos casos va ``shipment_products`` de los embarques no
+        serializados: sus cantidades dependen de los demás embarques y
+        proformas de las mismas POs, que no mueven su revisión.
+        Sin revisión (o una que el servidor no reconoce) va el payload completo.
+        """
         access = self.validate_token(token)
         if not access:
             return {"success": False, "message": "Token inválido."}
@@ -1987,7 +2367,38 @@ class SupplierPortalProformaService(SupplierPortalBaseService):
         if not proforma:
             return {"success": False, "message": "Proforma no encontrada."}
 
-        return {"success": True, "proforma": self.serialize_proforma(proforma)}
+        self.sync_service.flush_shipment_sync(proforma.shipment_ids)
+
+        current = self.portal_revision(proforma)
+        if isinstance(revision, dict) and self.safe_int(revision.get("proforma"), default=-1) == current["proforma"]:
+            known = {
+                str(sid): self.safe_int(rev, default=-1)
+                for sid, rev in (revision.get("shipments") or {}).items()
+            }
+            changed = proforma.shipment_ids.filtered(
+                lambda shipment: known.get(str(shipment.id)) != current["shipments"][str(shipment.id)]
+            )
+            shipment_products = {
+                str(shipment.id): self.sync_service.build_products_payload_for_shipment(shipment)
+                for shipment in proforma.shipment_ids - changed
+            }
+            if known == current["shipments"]:
+                return {
+                    "success": True,
+                    "not_modified": True,
+                    "revision": current,
+                    "shipment_products": shipment_products,
+                }
+            return {
+                "success": True,
+                "partial": True,
+                "revision": current,
+                "shipment_ids": self.sorted_shipments(proforma.shipment_ids).ids,
+                "shipment_products": shipment_products,
+                "proforma": self.serialize_proforma(proforma, shipment_records=changed),
+            }
+
+        return {"success": True, "revision": current, "proforma": self.serialize_proforma(proforma)}
 
     # =====================================================================
     #  ROW IMAGES
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import logging
+from datetime import timedelta
 
 from odoo import fields
 
@@ -9,6 +10,51 @@ from .supplier_portal_base import SupplierPortalBaseService
 _logger = logging.getLogger(__name__)
 
 
+class _FirstFitLines:
+    """Líneas de compra de un producto en orden FIFO con su capacidad libre.
+
+    ``take`` elige la PRIMERA línea donde cabe la cantidad (o la última si no
+    cabe en ninguna, para que el excedente quede visible ahí) con un árbol de
+    segmentos sobre el máximo remanente: O(log n) por fila en vez de recorrer
+    las líneas. ``remaining`` es el dict {line_id: libre} compartido entre
+    índices, de modo que las filas manuales y el FIFO consumen la misma
+    capacidad.
+    """
+
+    TOLERANCE = 1e-4
+
+    def __init__(self, lines, remaining):
+        self.ids = [line.id for line in lines]
+        self.size = 1
+        while self.size < len(self.ids):
+            self.size *= 2
+        self.tree = [float('-inf')] * (2 * self.size)
+        for i, line_id in enumerate(self.ids):
+            self.tree[self.size + i] = remaining.get(line_id, 0.0)
+        for i in range(self.size - 1, 0, -1):
+            self.tree[i] = max(self.tree[2 * i], self.tree[2 * i + 1])
+
+    def take(self, qty, remaining):
+        need = qty - self.TOLERANCE
+        if self.tree[1] < need:
+            pos = len(self.ids) - 1
+        else:
+            node = 1
+            while node < self.size:
+                node = 2 * node if self.tree[2 * node] >= need else 2 * node + 1
+            pos = node - self.size
+        line_id = self.ids[pos]
+        remaining[line_id] = remaining.get(line_id, 0.0) - qty
+
+        node = self.size + pos
+        self.tree[node] = remaining[line_id]
+        node //= 2
+        while node:
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+            node //= 2
+        return line_id
+
+
 class SupplierPortalSyncService(SupplierPortalBaseService):
     """
     Sincronización de portal -> Odoo con lógica corregida:
@@ -19,8 +65,17 @@ class SupplierPortalSyncService(SupplierPortalBaseService):
       el remanente disponible contra otros embarques
     """
 
+    # Segundos sin guardados del portal antes de la sincronización diferida.
+    SYNC_QUIET_SECONDS = 60
+
+    def __init__(self, env=None):
+        # Sin request (cron) el entorno se inyecta explícitamente.
+        self._env = env
+
     @property
     def env(self):
+        if self._env is not None:
+            return self._env
         from odoo.http import request
         return request.env
 
@@ -132,17 +187,13 @@ class SupplierPortalSyncService(SupplierPortalBaseService):
         """Embarcado ACUMULADO por producto en TODOS los embarques de todas
         las proformas de esas POs (todas las cargas históricas). Es la base
         del saldo pendiente global de la PI/PO (punto 10 del flujo)."""
-        result = {}
         headers = self.env['supplier.proforma.header'].sudo().search([
             ('purchase_id', 'in', pos.ids),
         ])
-        for header in headers:
-            for shipment in header.shipment_ids:
-                if exclude_shipment and shipment.id == exclude_shipment.id:
-                    continue
-                for pid, qty in self._shipment_qty_map(shipment).items():
-                    result[pid] = result.get(pid, 0.0) + qty
-        return result
+        shipments = headers.shipment_ids
+        if exclude_shipment:
+            shipments -= exclude_shipment
+        return self._sum_by_product(self._shipments_qty_aggregate(shipments.ids))
 
     def _po_ordered_qty_map(self, po):
         """
@@ -156,29 +207,74 @@ class SupplierPortalSyncService(SupplierPortalBaseService):
             result[pid] = result.get(pid, 0.0) + base_qty
         return result
 
+    # ---------------------------------------------------------------------
+    #  Agregados de cantidad (SQL, memorizados por transacción)
+    # ---------------------------------------------------------------------
+    # area_m2 (almacenado) es exactamente la cantidad efectiva de la fila
+    # (_row_effective_qty), así que los mapas se calculan con SUM agrupado en
+    # lugar de recorrer packings y filas en Python. El resultado se guarda en
+    # el caché del cursor y los modelos de packing/fila lo descartan en cada
+    # alta/escritura/borrado (ver _drop_portal_qty_cache).
+
+    QTY_CACHE_KEY = "supplier_portal_qty"
+
+    def _qty_cache(self):
+        return self.env.cr.cache.setdefault(self.QTY_CACHE_KEY, {})
+
+    def _flush_qty_sources(self):
+        self.env['supplier.shipment.packing.row'].flush_model([
+            'packing_id', 'product_id', 'area_m2', 'purchase_line_id', 'pi_header_id',
+        ])
+        self.env['supplier.shipment.packing'].flush_model(['shipment_id'])
+
+    def _shipments_qty_aggregate(self, shipment_ids):
+        """{shipment_id: {(po_id, product_id): qty}} para ``shipment_ids``.
+        ``po_id`` es la PO de la línea de compra de la fila, si no la de su
+        PI, si no 0 (misma precedencia que _row_po_id)."""
+        cache = self._qty_cache().setdefault("shipments", {})
+        missing = [sid for sid in set(shipment_ids) if sid not in cache]
+        if missing:
+            self._flush_qty_sources()
+            for sid in missing:
+                cache[sid] = {}
+            self.env.cr.execute(
+                """
+                SELECT pk.shipment_id,
+                       COALESCE(pol.order_id, ph.purchase_id, 0),
+                       r.product_id,
+                       SUM(COALESCE(r.area_m2, 0))
+                  FROM supplier_shipment_packing_row r
+                  JOIN supplier_shipment_packing pk ON pk.id = r.packing_id
+             LEFT JOIN purchase_order_line pol ON pol.id = r.purchase_line_id
+             LEFT JOIN supplier_proforma_header ph ON ph.id = r.pi_header_id
+                 WHERE pk.shipment_id IN %s
+              GROUP BY 1, 2, 3
+                """,
+                (tuple(missing),),
+            )
+            for sid, po_id, pid, qty in self.env.cr.fetchall():
+                cache[sid][(po_id, pid)] = qty or 0.0
+        return {sid: cache[sid] for sid in shipment_ids}
+
+    def _sum_by_product(self, aggregate):
+        result = {}
+        for bucket in aggregate.values():
+            for (_po_id, pid), qty in bucket.items():
+                result[pid] = result.get(pid, 0.0) + qty
+        return result
+
     def _shipment_qty_map(self, shipment):
         """
         Cantidad capturada actualmente en el shipment, basada en packings/rows.
         """
-        result = {}
-        for packing in shipment.packing_ids:
-            for row in packing.row_ids:
-                pid = row.product_id.id
-                qty = self._row_effective_qty(row)
-                result[pid] = result.get(pid, 0.0) + qty
-        return result
+        return self._sum_by_product(self._shipments_qty_aggregate([shipment.id]))
 
     def _other_shipments_qty_map(self, shipment):
         """
         Cantidad ya asignada/capturada en otros embarques de la misma proforma.
         """
-        result = {}
-        proforma = shipment.proforma_id
-        for other in proforma.shipment_ids.filtered(lambda s: s.id != shipment.id):
-            other_map = self._shipment_qty_map(other)
-            for pid, qty in other_map.items():
-                result[pid] = result.get(pid, 0.0) + qty
-        return result
+        others = shipment.proforma_id.shipment_ids - shipment
+        return self._sum_by_product(self._shipments_qty_aggregate(others.ids))
 
     def _row_po_id(self, row, default_po_id=0, allowed_ids=None):
         """PO a la que pertenece una fila del PL: su línea de compra, si no
@@ -199,30 +295,36 @@ class SupplierPortalSyncService(SupplierPortalBaseService):
         default_po_id = pos[:1].id if pos else 0
         allowed = set(pos.ids)
         result = {}
-        for packing in shipment.packing_ids:
-            for row in packing.row_ids:
-                po_id = self._row_po_id(row, default_po_id, allowed)
-                if not po_id:
-                    continue
-                bucket = result.setdefault(po_id, {})
-                pid = row.product_id.id
-                bucket[pid] = bucket.get(pid, 0.0) + self._row_effective_qty(row)
+        aggregate = self._shipments_qty_aggregate([shipment.id])[shipment.id]
+        for (po_id, pid), qty in aggregate.items():
+            po_id = po_id if po_id in allowed else default_po_id
+            if not po_id:
+                continue
+            bucket = result.setdefault(po_id, {})
+            bucket[pid] = bucket.get(pid, 0.0) + qty
         return result
 
     def _remaining_qty_map_for_po(self, shipment, po):
         """Remanente de UNA PO: su solicitud original menos lo ya asignado a
         sus líneas en cualquier OTRO embarque (filas trazadas)."""
         ordered = self._po_ordered_qty_map(po)
-        shipped_other = {}
-        rows = self.env['supplier.shipment.packing.row'].sudo().search([
-            ('purchase_line_id.order_id', '=', po.id),
-        ])
-        for row in rows:
-            if row.packing_id.shipment_id.id == shipment.id:
-                continue
-            pid = row.product_id.id
-            shipped_other[pid] = (
-                shipped_other.get(pid, 0.0) + self._row_effective_qty(row))
+        cache = self._qty_cache().setdefault("po_other", {})
+        key = (po.id, shipment.id)
+        if key not in cache:
+            self._flush_qty_sources()
+            self.env.cr.execute(
+                """
+                SELECT r.product_id, SUM(COALESCE(r.area_m2, 0))
+                  FROM supplier_shipment_packing_row r
+                  JOIN purchase_order_line pol ON pol.id = r.purchase_line_id
+                  JOIN supplier_shipment_packing pk ON pk.id = r.packing_id
+                 WHERE pol.order_id = %s AND pk.shipment_id != %s
+              GROUP BY r.product_id
+                """,
+                (po.id, shipment.id),
+            )
+            cache[key] = dict(self.env.cr.fetchall())
+        shipped_other = cache[key]
         return {
             pid: qty - shipped_other.get(pid, 0.0)
             for pid, qty in ordered.items()
@@ -505,24 +607,58 @@ class SupplierPortalSyncService(SupplierPortalBaseService):
         PO se queda SOLO con los contenedores que traen su material. Sin
         este reparto, la cabecera de todas las recepciones de una carga
         multi-proforma heredaba la lista completa del embarque (en la
-        práctica, el contenedor de la primera proforma repetido en todas)."""
+        práctica, el contenedor de la primera proforma repetido en todas).
+
+        Se lee en columna: una lectura de filas y una por cada relación
+        (línea de compra y PI) para llegar a la PO de cada fila."""
         pos = self._covered_pos_for_shipment(shipment)
         default_po_id = pos[:1].id if pos else 0
         allowed = set(pos.ids)
         Container = self.env['supplier.shipment.container'].sudo()
-        result = {}
-        for packing in shipment.packing_ids:
-            pk_containers = packing.container_ids
-            for row in packing.row_ids:
-                cont = row.container_id
-                if not cont and packing.scope == 'specific_containers' \
-                        and len(pk_containers) == 1:
-                    cont = pk_containers
-                if not cont:
-                    continue
-                po_id = self._row_po_id(row, default_po_id, allowed)
-                result[po_id] = result.get(po_id, Container.browse()) | cont
-        return result
+        packings = shipment.packing_ids
+        if not packings:
+            return {}
+
+        rows = self.env['supplier.shipment.packing.row'].sudo().search_read(
+            [('packing_id', 'in', packings.ids)],
+            ['packing_id', 'container_id', 'purchase_line_id', 'pi_header_id'],
+            load=None,
+        )
+        line_po = {
+            line['id']: line['order_id']
+            for line in self.env['purchase.order.line'].sudo().browse(
+                list({r['purchase_line_id'] for r in rows if r['purchase_line_id']})
+            ).read(['order_id'], load=None)
+        }
+        pi_po = {
+            pi['id']: pi['purchase_id']
+            for pi in self.env['supplier.proforma.header'].sudo().browse(
+                list({r['pi_header_id'] for r in rows if r['pi_header_id']})
+            ).read(['purchase_id'], load=None)
+        }
+        single_container = {
+            packing.id: packing.container_ids.id
+            for packing in packings
+            if packing.scope == 'specific_containers' and len(packing.container_ids) == 1
+        }
+
+        container_ids_by_po = {}
+        for row in rows:
+            container_id = row['container_id'] or single_container.get(row['packing_id'])
+            if not container_id:
+                continue
+            # Misma precedencia que _row_po_id: línea de compra, luego PI.
+            if row['purchase_line_id']:
+                po_id = line_po.get(row['purchase_line_id']) or 0
+            else:
+                po_id = pi_po.get(row['pi_header_id']) or 0
+            if po_id not in allowed:
+                po_id = 0
+            container_ids_by_po.setdefault(po_id or default_po_id, {})[container_id] = True
+        return {
+            po_id: Container.browse(list(container_ids))
+            for po_id, container_ids in container_ids_by_po.items()
+        }
 
     def _invoice_number_for_po(self, shipment, po_header, containers):
         """No. de factura de UNA proforma: 1) el capturado en SU PI;
@@ -557,81 +693,122 @@ class SupplierPortalSyncService(SupplierPortalBaseService):
             prefix + 'volume': float(sum(containers.mapped('volume')) or 0.0),
         }
 
+    # Clave de header_data (update_packing_list_from_portal) -> campo del picking.
+    PICKING_HEADER_FIELDS = {
+        "invoice_number": "supplier_invoice_number",
+        "payment_terms": "supplier_payment_terms",
+        "country_origin": "supplier_country_origin",
+        "incoterm": "supplier_incoterm_payment",
+        "merchandise_desc": "supplier_merchandise_desc",
+        "bl_number": "supplier_bl_number",
+        "origin": "supplier_origin",
+        "destination": "supplier_destination",
+        "vessel": "supplier_vessel",
+        "container_no": "supplier_container_no",
+        "seal_no": "supplier_seal_no",
+        "container_type": "supplier_container_type",
+        "total_packages": "supplier_total_packages",
+        "gross_weight": "supplier_gross_weight",
+        "volume": "supplier_volume",
+        "status": "supplier_status",
+        "proforma_number": "supplier_proforma_number",
+    }
+
+    def _shipment_header_data_by_po(self, shipment, po_ids):
+        """{po_id: header_data} de las recepciones del embarque en una sola
+        pasada: agregados de contenedores del embarque una vez, un search de
+        las PI de todas las POs y un reparto de contenedores por PO.
+
+        BL, buque, puertos, ETD y estatus son del embarque completo y se
+        comparten. Los contenedores son los DE CADA PO (según sus filas del
+        PL); si las filas aún no reparten contenedor, se queda la lista
+        global. Factura, términos, origen, incoterm y observaciones viajan
+        por proforma: cada recepción usa los de SU PI, jamás los de la
+        primera proforma de la carga."""
+        header = shipment.proforma_id
+        base = {
+            "invoice_number": header.invoice_global_number or "",
+            "payment_terms": header.payment_terms or "",
+            "country_origin": header.country_origin or "",
+            "origin": shipment.port_origin or "",
+            "destination": shipment.port_destination or "",
+            "incoterm": header.incoterm or "",
+            "bl_number": shipment.bl_number or "",
+            "shipment_date": str(shipment.etd) if shipment.etd else "",
+            "vessel": shipment.vessel_name or "",
+            "merchandise_desc": header.general_notes or "",
+            "status": shipment.status or "",
+        }
+        base.update(self._container_header_vals(shipment.container_ids, ''))
+
+        header_by_po = {}
+        for po_header in self.env['supplier.proforma.header'].sudo().search(
+                [('purchase_id', 'in', [po_id for po_id in po_ids if po_id])]):
+            header_by_po.setdefault(po_header.purchase_id.id, po_header)
+
+        containers_by_po = self._containers_by_po(shipment)
+        result = {}
+        for po_id in po_ids:
+            po_header = header_by_po.get(po_id) or header
+            data = dict(base, proforma_number=po_header.proforma_number or "")
+            own_containers = containers_by_po.get(po_id)
+            if own_containers:
+                data.update(self._container_header_vals(own_containers, ''))
+            if po_header:
+                data.update({
+                    'invoice_number': self._invoice_number_for_po(
+                        shipment, po_header, own_containers),
+                    'payment_terms': po_header.payment_terms or '',
+                    'country_origin': po_header.country_origin or '',
+                    'incoterm': po_header.incoterm or '',
+                    'merchandise_desc': po_header.general_notes or '',
+                })
+            result[po_id] = data
+        return result
+
     def sync_shipment_header_to_picking(self, shipment):
         main_picking = self.get_or_create_picking_for_shipment(shipment)
         if not main_picking:
             return False
 
         header = shipment.proforma_id
-        Header = self.env['supplier.proforma.header'].sudo()
-        container_numbers = list(dict.fromkeys([x for x in shipment.container_ids.mapped("container_number") if x]))
-        seal_numbers = list(dict.fromkeys([x for x in shipment.container_ids.mapped("seal_number") if x]))
-        container_types = list(dict.fromkeys([x for x in shipment.container_ids.mapped("container_type") if x]))
-
-        base_vals = {
-            "supplier_invoice_number": header.invoice_global_number or "",
-            "supplier_payment_terms": header.payment_terms or "",
-            "supplier_country_origin": header.country_origin or "",
-            "supplier_incoterm_payment": header.incoterm or "",
-            "supplier_merchandise_desc": header.general_notes or "",
-            "supplier_shipment_date": shipment.etd or False,
-            "supplier_bl_number": shipment.bl_number or "",
-            "supplier_origin": shipment.port_origin or "",
-            "supplier_destination": shipment.port_destination or "",
-            "supplier_vessel": shipment.vessel_name or "",
-            "supplier_container_no": ", ".join(container_numbers) if container_numbers else "",
-            "supplier_seal_no": ", ".join(seal_numbers) if seal_numbers else "",
-            "supplier_container_type": ", ".join(container_types) if container_types else "",
-            "supplier_total_packages": int(sum(shipment.container_ids.mapped("packages")) or 0),
-            "supplier_gross_weight": float(sum(shipment.container_ids.mapped("weight")) or 0.0),
-            "supplier_volume": float(sum(shipment.container_ids.mapped("volume")) or 0.0),
-            "supplier_status": shipment.status or "",
+        pickings = self._find_pickings_for_shipment(shipment)
+        po_by_picking = {
+            picking.id: picking.supplier_cargo_po_id or header.purchase_id
+            for picking in pickings
         }
+        data_by_po = self._shipment_header_data_by_po(
+            shipment, list({po.id for po in po_by_picking.values()}))
+
+        extra_vals = {"supplier_shipment_date": shipment.etd or False}
+        # Naviera/forwarder del catálogo → recepción (si el módulo del
+        # tarifario agregó los campos al picking).
+        if 'som_naviera_id' in pickings._fields and getattr(shipment, 'naviera_id', False):
+            extra_vals['som_naviera_id'] = shipment.naviera_id.id
+        if 'som_forwarder_id' in pickings._fields and getattr(shipment, 'forwarder_id', False):
+            extra_vals['som_forwarder_id'] = shipment.forwarder_id.id
+
+        # Recepciones con los mismos valores se escriben juntas.
+        grouped = {}
+        for picking in pickings:
+            po = po_by_picking[picking.id]
+            data = data_by_po[po.id]
+            vals = dict(extra_vals, origin=self._prepare_picking_origin(po, shipment))
+            for key, field_name in self.PICKING_HEADER_FIELDS.items():
+                vals[field_name] = data[key]
+            grouped.setdefault(tuple(sorted(vals.items())), []).append(picking.id)
 
         ok = True
-        containers_by_po = self._containers_by_po(shipment)
-        for picking in self._find_pickings_for_shipment(shipment):
-            po = picking.supplier_cargo_po_id or header.purchase_id
-            po_header = Header.search(
-                [('purchase_id', '=', po.id)], limit=1) or header
-            vals = dict(
-                base_vals,
-                origin=self._prepare_picking_origin(po, shipment),
-                supplier_proforma_number=po_header.proforma_number or "",
-            )
-            # Contenedores DE ESTA PO (según sus filas del PL); si las filas
-            # aún no reparten contenedor, se queda la lista global.
-            own_containers = containers_by_po.get(po.id)
-            if own_containers:
-                vals.update(self._container_header_vals(
-                    own_containers, 'supplier_'))
-            # DATOS DE LA PI PROPIA: factura, términos, origen, incoterm y
-            # observaciones viajan por proforma — la cabecera de cada
-            # recepción usa los de SU PI, jamás los de la primera proforma
-            # de la carga. (BL, buque, puertos, ETD y estatus sí son del
-            # embarque completo y se comparten.)
-            if po_header:
-                vals.update({
-                    'supplier_invoice_number': self._invoice_number_for_po(
-                        shipment, po_header, own_containers),
-                    'supplier_payment_terms': po_header.payment_terms or '',
-                    'supplier_country_origin': po_header.country_origin or '',
-                    'supplier_incoterm_payment': po_header.incoterm or '',
-                    'supplier_merchandise_desc': po_header.general_notes or '',
-                })
-            # Naviera/forwarder del catálogo → recepción (si el módulo del
-            # tarifario agregó los campos al picking).
-            if 'som_naviera_id' in picking._fields and getattr(shipment, 'naviera_id', False):
-                vals['som_naviera_id'] = shipment.naviera_id.id
-            if 'som_forwarder_id' in picking._fields and getattr(shipment, 'forwarder_id', False):
-                vals['som_forwarder_id'] = shipment.forwarder_id.id
+        Picking = self.env["stock.picking"].sudo()
+        for vals, picking_ids in grouped.items():
             try:
-                picking.sudo().write(vals)
+                with self.env.cr.savepoint():
+                    Picking.browse(picking_ids).write(dict(vals))
             except Exception:
                 ok = False
                 _logger.exception(
-                    "[Portal] Error sincronizando cabecera de shipment %s al picking %s.",
-                    shipment.id, picking.id,
+                    "[Portal] Error sincronizando cabecera de shipment %s a los pickings %s.",
+                    shipment.id, picking_ids,
                 )
         return main_picking if ok or main_picking else False
 
@@ -640,8 +817,6 @@ class SupplierPortalSyncService(SupplierPortalBaseService):
         if not main_picking:
             return False
 
-        header = shipment.proforma_id
-        Header = self.env['supplier.proforma.header'].sudo()
         pos = self._covered_pos_for_shipment(shipment)
         default_po_id = pos[:1].id if pos else 0
         allowed = set(pos.ids)
@@ -684,50 +859,17 @@ class SupplierPortalSyncService(SupplierPortalBaseService):
                     "packing_container_ids": packing_container_ids,
                 })
 
-        base_header_data = {
-            "invoice_number": header.invoice_global_number or "",
-            "payment_terms": header.payment_terms or "",
-            "country_origin": header.country_origin or "",
-            "origin": shipment.port_origin or "",
-            "destination": shipment.port_destination or "",
-            "incoterm": header.incoterm or "",
-            "bl_number": shipment.bl_number or "",
-            "shipment_date": str(shipment.etd) if shipment.etd else "",
-            "vessel": shipment.vessel_name or "",
-            "merchandise_desc": header.general_notes or "",
-            "container_no": ", ".join([x for x in shipment.container_ids.mapped("container_number") if x]),
-            "seal_no": ", ".join([x for x in shipment.container_ids.mapped("seal_number") if x]),
-            "container_type": ", ".join([x for x in shipment.container_ids.mapped("container_type") if x]),
-            "total_packages": int(sum(shipment.container_ids.mapped("packages")) or 0),
-            "gross_weight": float(sum(shipment.container_ids.mapped("weight")) or 0.0),
-            "volume": float(sum(shipment.container_ids.mapped("volume")) or 0.0),
-            "status": shipment.status or "",
-        }
-
         ok = True
-        containers_by_po = self._containers_by_po(shipment)
-        for picking in self._find_pickings_for_shipment(shipment):
-            po = picking.supplier_cargo_po_id
-            po_id = po.id if po else default_po_id
-            po_header = Header.search(
-                [('purchase_id', '=', po_id)], limit=1) or header
-            header_data = dict(
-                base_header_data,
-                proforma_number=po_header.proforma_number or "",
-            )
-            own_containers = containers_by_po.get(po_id)
-            if own_containers:
-                header_data.update(self._container_header_vals(
-                    own_containers, ''))
-            if po_header:
-                header_data.update({
-                    'invoice_number': self._invoice_number_for_po(
-                        shipment, po_header, own_containers),
-                    'payment_terms': po_header.payment_terms or '',
-                    'country_origin': po_header.country_origin or '',
-                    'incoterm': po_header.incoterm or '',
-                    'merchandise_desc': po_header.general_notes or '',
-                })
+        pickings = self._find_pickings_for_shipment(shipment)
+        po_by_picking = {
+            picking.id: picking.supplier_cargo_po_id.id or default_po_id
+            for picking in pickings
+        }
+        data_by_po = self._shipment_header_data_by_po(
+            shipment, list(set(po_by_picking.values())))
+        for picking in pickings:
+            po_id = po_by_picking[picking.id]
+            header_data = data_by_po[po_id]
             try:
                 picking.sudo().update_packing_list_from_portal(
                     rows_by_po.get(po_id, []), header_data=header_data)
@@ -775,67 +917,80 @@ class SupplierPortalSyncService(SupplierPortalBaseService):
                 capacity[line.id] = (
                     line.x_qty_solicitada_original or line.product_qty or 0.0)
 
-        all_rows = self.env['supplier.shipment.packing.row'].sudo()
-        for header in headers:
-            for ship in header.shipment_ids.sorted('id'):
-                for packing in ship.packing_ids.sorted('id'):
-                    all_rows |= packing.row_ids
-
+        # Todas las filas de la carga en UNA lectura (antes: recorrido
+        # proforma -> embarque -> packing -> filas, con una consulta por nivel).
+        all_rows = self.env['supplier.shipment.packing.row'].sudo().search_fetch(
+            [('packing_id.shipment_id.proforma_id', 'in', headers.ids)],
+            ['packing_id', 'sequence', 'product_id', 'tipo', 'alto', 'ancho',
+             'quantity', 'pi_manual', 'pi_header_id', 'purchase_line_id'],
+        )
         po_by_header = {h.id: h.purchase_id.id for h in headers}
+        line_po = {
+            line.id: line.order_id.id
+            for lines in lines_by_product.values() for line in lines
+        }
         sorted_rows = all_rows.sorted(
             lambda r: (r.packing_id.id, r.sequence, r.id))
 
         # Dos pasadas: PRIMERO las filas con PI elegida a mano en el portal
         # (consumen la capacidad de SU PO), después el FIFO llena el resto.
-        consumed = {}
-
-        def pick_line(lines, qty):
-            return next(
-                (l for l in lines
-                 if consumed.get(l.id, 0.0) + qty
-                 <= capacity.get(l.id, 0.0) + 1e-4),
-                lines[-1],
-            )
+        # La capacidad libre por línea vive en un índice first-fit por
+        # producto (O(log n) por fila) y las escrituras se agrupan por valor
+        # destino: solo las filas cuya asignación cambió se escriben.
+        remaining = dict(capacity)
+        manual_writes = {}
+        auto_writes = {}
 
         manual_rows = sorted_rows.filtered(
             lambda r: r.pi_manual and r.pi_header_id)
         auto_rows = sorted_rows - manual_rows
 
+        manual_index = {}
         for row in manual_rows:
             po_id = po_by_header.get(row.pi_header_id.id)
-            lines = [
-                l for l in (lines_by_product.get(row.product_id.id) or [])
-                if l.order_id.id == po_id
-            ]
-            if not lines:
+            key = (row.product_id.id, po_id)
+            if key not in manual_index:
+                lines = [
+                    l for l in (lines_by_product.get(row.product_id.id) or [])
+                    if l.order_id.id == po_id
+                ]
+                manual_index[key] = _FirstFitLines(lines, remaining) if lines else None
+            index = manual_index[key]
+            if not index:
                 # La PI elegida no tiene línea de ese producto: se respeta la
                 # PI del proveedor y la fila queda sin línea de compra.
                 if row.purchase_line_id:
-                    row.write({'purchase_line_id': False})
+                    manual_writes.setdefault(False, []).append(row.id)
                 continue
-            qty = self._row_effective_qty(row)
-            target = pick_line(lines, qty)
-            consumed[target.id] = consumed.get(target.id, 0.0) + qty
-            if (row.purchase_line_id.id or False) != target.id:
-                row.write({'purchase_line_id': target.id})
-
-        for row in auto_rows.sorted(
-                lambda r: (r.packing_id.id, r.sequence, r.id)):
-            lines = lines_by_product.get(row.product_id.id) or []
-            target = False
-            if lines:
-                qty = self._row_effective_qty(row)
-                target = pick_line(lines, qty)
-                consumed[target.id] = consumed.get(target.id, 0.0) + qty
-            header = header_by_po.get(target.order_id.id) if target else False
-            new_line_id = target.id if target else False
-            new_header_id = header.id if header else False
+            target_id = index.take(self._row_effective_qty(row), remaining)
+            if (row.purchase_line_id.id or False) != target_id:
+                manual_writes.setdefault(target_id, []).append(row.id)
+
+        auto_index = {}
+        for row in auto_rows:
+            pid = row.product_id.id
+            if pid not in auto_index:
+                lines = lines_by_product.get(pid) or []
+                auto_index[pid] = _FirstFitLines(lines, remaining) if lines else None
+            index = auto_index[pid]
+            new_line_id = False
+            new_header_id = False
+            if index:
+                new_line_id = index.take(self._row_effective_qty(row), remaining)
+                header = header_by_po.get(line_po[new_line_id])
+                new_header_id = header.id if header else False
             if (row.purchase_line_id.id or False) != new_line_id \
                     or (row.pi_header_id.id or False) != new_header_id:
-                row.write({
-                    'purchase_line_id': new_line_id,
-                    'pi_header_id': new_header_id,
-                })
+                auto_writes.setdefault((new_line_id, new_header_id), []).append(row.id)
+
+        Row = self.env['supplier.shipment.packing.row'].sudo()
+        for line_id, row_ids in manual_writes.items():
+            Row.browse(row_ids).write({'purchase_line_id': line_id})
+        for (line_id, header_id), row_ids in auto_writes.items():
+            Row.browse(row_ids).write({
+                'purchase_line_id': line_id,
+                'pi_header_id': header_id,
+            })
 
     def _sync_po_commercial_qty(self, shipment):
         """Actualiza la cantidad COMERCIAL de la OC con lo embarcado real.
@@ -942,6 +1097,13 @@ class SupplierPortalSyncService(SupplierPortalBaseService):
             line.with_context(skip_date_sync=True).write(vals)
 
     def sync_shipment(self, shipment):
+        requested_at = shipment.portal_sync_requested_at if shipment.portal_sync_pending else None
+        picking = self._sync_shipment_now(shipment)
+        if requested_at:
+            self._clear_shipment_sync_pending(shipment, requested_at)
+        return picking
+
+    def _sync_shipment_now(self, shipment):
         # PRIMERO el reparto PI/PO por fila: las recepciones POR PO dependen
         # de saber a qué orden pertenece cada fila del PL.
         self._allocate_rows_to_po_lines(shipment)
@@ -957,6 +1119,49 @@ class SupplierPortalSyncService(SupplierPortalBaseService):
         for shipment in self.sorted_shipments(proforma.shipment_ids):
             self.sync_shipment(shipment)
 
+    # =====================================================================
+    #  SINCRONIZACIÓN DIFERIDA
+    # =====================================================================
+
+    def schedule_shipment_sync(self, shipment):
+        """Difiere ``sync_shipment`` tras un guardado del portal: marca el
+        embarque y agenda el cron al final del periodo de silencio. Varios
+        guardados seguidos se coalescen en UNA sincronización. Sin el cron
+        disponible se sincroniza en línea como antes."""
+        cron = self.env.ref(
+            "stock_lot_packing_import.ir_cron_portal_shipment_sync",
+            raise_if_not_found=False,
+        )
+        if not cron or not cron.active:
+            return self.sync_shipment(shipment)
+
+        now = fields.Datetime.now()
+        shipment.sudo().write({
+            "portal_sync_pending": True,
+            "portal_sync_requested_at": now,
+        })
+        cron.sudo()._trigger(at=now + timedelta(seconds=self.SYNC_QUIET_SECONDS))
+        return True
+
+    def flush_shipment_sync(self, shipments):
+        """Ejecuta YA la sincronización pendiente de ``shipments`` (al
+        completar o recargar el portal: el proveedor debe ver lo real)."""
+        for shipment in self.sorted_shipments(shipments.filtered("portal_sync_pending")):
+            self.sync_shipment(shipment)
+
+    def _clear_shipment_sync_pending(self, shipment, requested_at):
+        # Solo se limpia si nadie volvió a marcarlo mientras se sincronizaba;
+        # de lo contrario queda pendiente para la siguiente pasada.
+        self.env.cr.execute(
+            """
+            UPDATE supplier_shipment
+               SET portal_sync_pending = FALSE
+             WHERE id = %s AND portal_sync_requested_at = %s
+            """,
+            (shipment.id, requested_at),
+        )
+        shipment.invalidate_recordset(["portal_sync_pending"])
+
     # =====================================================================
     #  ELIMINACIÓN
     # =====================================================================
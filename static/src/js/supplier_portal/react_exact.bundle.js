@@ -256,6 +256,10 @@ function somFormatDate(value, options) {
                     return { id: c.id || ('c' + i), number: s(c.container_number || c.number, ''), seal: s(c.seal_number || c.seal, ''), type: s(String(c.container_type || c.type || '40').replace(/\D/g, '').slice(0, 2) || '40', '40'), weight: n(c.weight, 0), volume: n(c.volume, 0), packages: n(c.packages, 0) };
                 }),
                 packings: arr(sh.packings).map(function (pk) { return normalizePacking(pk, sh, shipProducts); }),
+                // Saldos por producto de ESTE embarque (pedido / otros embarques
+                // / este embarque); el reload por revisión los refresca aunque
+                // el embarque no haya cambiado.
+                products: shipProducts,
                 documents: arr(sh.documents).map(function (d) { return { id: d.id, name: s(d.name || d.file_name, 'documento'), kind: docKind(d.document_type || d.kind), size: n(d.file_size || d.size, 0), uploaded: s(d.uploaded || d.create_date || '', '') }; })
             };
         });
@@ -283,6 +287,7 @@ function somFormatDate(value, options) {
     }
     var rawPayload = parsePayload();
     window.SupplierReactExactNormalize = normalize;
+    window.SupplierReactExactProduct = productFromOdoo;
     window.SupplierReactExactData = { raw: rawPayload, proforma: normalize(rawPayload) };
     // Flag global de "compra nacional": ajusta SOLO la vista del proveedor
     // (nombres, pasos y columnas). Lo leen el sistema i18n y las vistas.
@@ -4293,6 +4298,32 @@ function portalScope(value) {
     }
     return 'full_shipment';
 }
+// Autosave por delta del packing (/supplier/api/v2/save_packing_delta):
+// compara las filas del payload contra las últimas que el servidor confirmó
+// (por id real). Devuelve null si hay una fila con id real que el servidor no
+// confirmó en esta sesión: eso solo lo re-empareja el guardado completo.
+function portalPackingDelta(syncedRows, rows) {
+    const inserted = [], updated = [], seen = {};
+    for (const row of rows) {
+        if (!row.id) {
+            inserted.push(row);
+            continue;
+        }
+        const prev = syncedRows[row.id];
+        if (!prev || seen[row.id])
+            return null;
+        seen[row.id] = true;
+        const changed = {};
+        Object.keys(row).forEach(key => {
+            if (key !== 'id' && key !== '_client_id' && JSON.stringify(row[key]) !== JSON.stringify(prev[key]))
+                changed[key] = row[key];
+        });
+        if (Object.keys(changed).length)
+            updated.push(Object.assign({ id: row.id, _client_id: row._client_id }, changed));
+    }
+    const deleted = Object.keys(syncedRows).filter(id => !seen[id]).map(id => parseInt(id, 10));
+    return { inserted, updated, deleted };
+}
 async function portalRpc(route, params) {
     const response = await fetch(route, {
         method: 'POST',
@@ -4330,6 +4361,35 @@ function normalizePortalProforma(proforma) {
     }
     return (window.SupplierReactExactData && window.SupplierReactExactData.proforma) || MOCK_PROFORMA;
 }
+// Respuesta de /supplier/api/v2/reload sobre ``synced`` (estado ya confirmado
+// por el servidor para la revisión enviada). ``not_modified`` conserva los
+// embarques; ``partial`` trae solo los que cambiaron y ``shipment_ids`` con el
+// orden vigente. En ambos casos ``shipment_products`` refresca las cantidades
+// de los embarques que no vinieron. Devuelve null si la respuesta menciona un
+// embarque que el estado local no tiene: hay que pedir el payload completo.
+function mergePortalReload(synced, result) {
+    if (!result.not_modified && !result.partial)
+        return normalizePortalProforma(result.proforma);
+    const base = result.not_modified ? synced : normalizePortalProforma(result.proforma);
+    const changed = {};
+    if (result.partial)
+        base.shipments.forEach(sh => { changed[String(sh.id)] = sh; });
+    const known = {};
+    (synced.shipments || []).forEach(sh => { known[String(sh.id)] = sh; });
+    const order = result.partial ? (result.shipment_ids || []) : (synced.shipments || []).map(sh => sh.id);
+    const products = result.shipment_products || {};
+    const shipments = [];
+    for (const sid of order) {
+        const sh = changed[String(sid)] || known[String(sid)];
+        if (!sh)
+            return null;
+        const next = Object.assign({}, sh, { number: shipments.length + 1 });
+        if (!changed[String(sid)] && Array.isArray(products[String(sid)]) && window.SupplierReactExactProduct)
+            next.products = products[String(sid)].map(window.SupplierReactExactProduct);
+        shipments.push(next);
+    }
+    return Object.assign({}, base, { shipments });
+}
 
 function App() {
     const [tweaks, setTweak] = useTweaks(TWEAK_DEFAULTS);
@@ -4348,6 +4408,13 @@ function App() {
     const proformaRef = React.useRef(proforma);
     const lastHashRef = React.useRef(JSON.stringify(proforma));
     const idMapRef = React.useRef({ shipments: {}, containers: {}, invoices: {}, packings: {}, rows: {} });
+    // Revisión del portal ({proforma, shipments}) del último estado que llegó
+    // del servidor: la del render de la página y luego la de cada reload.
+    const revisionRef = React.useRef((PORTAL_RAW_PAYLOAD.proforma && PORTAL_RAW_PAYLOAD.proforma.revision) || null);
+    // Por packing real: revisión, cabecera y filas (payload + sequence, por id
+    // real) que el servidor confirmó en esta sesión. Con eso el autosave manda
+    // solo el delta; sin entrada (primer guardado, revisión vieja) va completo.
+    const packingSyncRef = React.useRef({});
     // Imágenes capturadas en el asistente que aún no se suben a Odoo. Se suben de
     // forma diferida en persistSnapshot cuando ya existen el embarque / las filas
     // (y por tanto sus ids reales). blocks: por b.id · rows: por id de fila.
@@ -4450,6 +4517,55 @@ function App() {
             };
         });
     }, [containerIdForRow, findProduct, realMappedId]);
+    const rememberPackingRows = React.useCallback((packingId, revision, meta, rows, savedRows) => {
+        const ids = {};
+        (savedRows || []).forEach(r => {
+            if (r.client_id && r.id)
+                ids[r.client_id] = r.id;
+        });
+        const synced = {};
+        rows.forEach(row => {
+            const id = row.id || ids[row._client_id];
+            if (id)
+                synced[id] = Object.assign({}, row, { id });
+        });
+        packingSyncRef.current[packingId] = { revision, meta, rows: synced };
+    }, []);
+    const persistPackingRows = React.useCallback(async (shipmentId, packingData, packingRows) => {
+        const rows = packingRows.map((row, idx) => Object.assign({}, row, { sequence: (idx + 1) * 10 }));
+        const meta = JSON.stringify(Object.assign({}, packingData, { id: undefined }));
+        const synced = packingData.id && packingSyncRef.current[packingData.id];
+        const delta = synced && synced.meta === meta ? portalPackingDelta(synced.rows, rows) : null;
+        if (delta) {
+            if (!delta.inserted.length && !delta.updated.length && !delta.deleted.length)
+                return { success: true, packing_id: packingData.id, revision: synced.revision, rows: [] };
+            const result = await portalRpc('/supplier/api/v2/save_packing_delta', {
+                token: PORTAL_TOKEN,
+                packing_id: packingData.id,
+                revision: synced.revision,
+                inserted: delta.inserted,
+                updated: delta.updated,
+                deleted: delta.deleted,
+            });
+            if (result && result.success) {
+                rememberPackingRows(packingData.id, result.revision, meta, rows, result.rows);
+                return result;
+            }
+            // Revisión vieja (``stale``: otra pestaña o sesión guardó) o delta
+            // rechazado: el guardado completo re-empareja filas y aplica los
+            // blindajes de save_packing.
+            delete packingSyncRef.current[packingData.id];
+        }
+        const result = await portalRpc('/supplier/api/v2/save_packing', {
+            token: PORTAL_TOKEN,
+            shipment_id: shipmentId,
+            packing_data: packingData,
+            rows,
+        });
+        if (result && result.success && result.packing_id)
+            rememberPackingRows(result.packing_id, result.revision, meta, rows, result.rows);
+        return result;
+    }, [rememberPackingRows]);
     const persistSnapshot = React.useCallback(async (snapshot) => {
         if (!PORTAL_TOKEN || t.show_completed_route)
             return;
@@ -4520,25 +4636,20 @@ function App() {
             for (const packing of (ship.packings || [])) {
                 const packKey = shipmentId + ':' + packing.id;
                 const packingId = realMappedId('packings', packKey, packing.id);
-                const packingResult = await portalRpc('/supplier/api/v2/save_packing', {
-                    token: PORTAL_TOKEN,
-                    shipment_id: shipmentId,
-                    packing_data: {
-                        id: packingId || false,
-                        packing_number: packing.number || '',
-                        packing_date: packing.date || false,
-                        scope: 'full_shipment',
-                        container_ids: [],
-                        // ESTRUCTURA COMPLETA del asistente: se persiste tal
-                        // cual (bloques + productos) para reconstruirla al
-                        // recargar aunque las filas sigan vacías.
-                        structure: JSON.stringify({
-                            products: packing.products || [],
-                            blocks: packing.blocks || [],
-                        }),
-                    },
-                    rows: buildPackingRows(snapshot, shipmentId, ship, packing, packing.rows || []),
-                });
+                const packingResult = await persistPackingRows(shipmentId, {
+                    id: packingId || false,
+                    packing_number: packing.number || '',
+                    packing_date: packing.date || false,
+                    scope: 'full_shipment',
+                    container_ids: [],
+                    // ESTRUCTURA COMPLETA del asistente: se persiste tal
+                    // cual (bloques + productos) para reconstruirla al
+                    // recargar aunque las filas sigan vacías.
+                    structure: JSON.stringify({
+                        products: packing.products || [],
+                        blocks: packing.blocks || [],
+                    }),
+                }, buildPackingRows(snapshot, shipmentId, ship, packing, packing.rows || []));
                 if (!packingResult || !packingResult.success)
                     throw new Error((packingResult && packingResult.message) || 'No se pudo guardar el packing list.');
                 const realPackingId = packingResult.packing_id;
@@ -4593,7 +4704,7 @@ function App() {
         // como sincronizado (syncedHash = currentHash) e incluyendo el idMap actual.
         savePortalDraft(snapshot, idMapRef.current, currentHash);
         setSaveState('saved');
-    }, [buildContainerPayload, buildInvoicePayload, buildPackingRows, shipmentPayload, realMappedId, t.show_completed_route]);
+    }, [buildContainerPayload, buildInvoicePayload, buildPackingRows, persistPackingRows, shipmentPayload, realMappedId, t.show_completed_route]);
     const runPersist = React.useCallback(async (snapshot) => {
         if (savingRef.current) {
             pendingRef.current = snapshot;
@@ -4633,13 +4744,31 @@ function App() {
             return next;
         });
     }, [schedulePersist, t.show_completed_route]);
+    // Pide el estado del servidor. Si lo local ya está confirmado (sin cambios
+    // pendientes) se manda la revisión que se tiene y el servidor responde solo
+    // lo que cambió; con cambios pendientes va el payload completo, como antes.
+    // Devuelve el estado nuevo o null si el servidor no respondió con éxito.
+    const fetchPortalState = React.useCallback(async () => {
+        const synced = proformaRef.current;
+        const inSync = revisionRef.current && JSON.stringify(synced) === lastHashRef.current;
+        let result = await portalRpc('/supplier/api/v2/reload', inSync
+            ? { token: PORTAL_TOKEN, revision: revisionRef.current }
+            : { token: PORTAL_TOKEN });
+        let next = result && result.success ? mergePortalReload(synced, result) : null;
+        if (result && result.success && !next) {
+            result = await portalRpc('/supplier/api/v2/reload', { token: PORTAL_TOKEN });
+            next = result && result.success && result.proforma ? normalizePortalProforma(result.proforma) : null;
+        }
+        if (next)
+            revisionRef.current = result.revision || null;
+        return next;
+    }, []);
     const reloadPortal = React.useCallback(async () => {
         if (!PORTAL_TOKEN || t.show_completed_route)
             return;
         try {
-            const result = await portalRpc('/supplier/api/v2/reload', { token: PORTAL_TOKEN });
-            if (result && result.success && result.proforma) {
-                const normalized = normalizePortalProforma(result.proforma);
+            const normalized = await fetchPortalState();
+            if (normalized) {
                 proformaRef.current = normalized;
                 lastHashRef.current = JSON.stringify(normalized);
                 setProformaRaw(normalized);
@@ -4649,7 +4778,7 @@ function App() {
             console.error('[SupplierPortal] Error recargando portal:', err);
             setSaveState('error');
         }
-    }, [t.show_completed_route]);
+    }, [fetchPortalState, t.show_completed_route]);
     const flushPersist = React.useCallback(async () => {
         if (saveTimerRef.current) {
             clearTimeout(saveTimerRef.current);
@@ -4703,9 +4832,9 @@ function App() {
         (async () => {
             // 1) Verdad del servidor (lo último confirmado en Odoo).
             try {
-                const result = await portalRpc('/supplier/api/v2/reload', { token: PORTAL_TOKEN });
-                if (result && result.success && result.proforma) {
-                    base = normalizePortalProforma(result.proforma);
+                const next = await fetchPortalState();
+                if (next) {
+                    base = next;
                     proformaRef.current = base;
                     lastHashRef.current = JSON.stringify(base);
                     setProformaRaw(base);
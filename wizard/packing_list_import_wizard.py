@@ -1,14 +1,19 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, _
 from odoo.exceptions import UserError
-import base64
-import io
 import json
 import logging
 import re
 
+from ..models import pl_template, spreadsheet_rows
+
 _logger = logging.getLogger(__name__)
 
+# Registros por create(vals_list) al importar el PL: suficientemente grande
+# para que un contenedor completo salga en uno o dos INSERT, acotado para no
+# armar una sola transacción de miles de filas con sus recómputos.
+_PL_CREATE_CHUNK = 500
+
 
 class _PLCellsIndex:
     """Clase para normalizar el acceso a celdas de Odoo Spreadsheet"""
@@ -93,12 +98,9 @@ class _PLCellsIndex:
                     self.put(col, row, content, source="UPDATE_CELL_REV")
                     applied += 1
 
-            elif cmd_type == "REMOVE_COLUMNS_ROWS":
-                if cmd.get("dimension") == "row":
-                    elements = sorted(cmd.get("elements", []), reverse=True)
-                    for row_idx in elements:
-                        self._shift_rows_up(row_idx)
-                    applied += 1
+            elif spreadsheet_rows.is_row_operation(cmd):
+                self._cells = spreadsheet_rows.apply_row_operation(self._cells, cmd)
+                applied += 1
 
             elif cmd_type in ("DELETE_CONTENT", "CLEAR_CELL"):
                 zones = cmd.get("zones") or cmd.get("target") or []
@@ -118,14 +120,42 @@ class _PLCellsIndex:
 
         return applied
 
-    def _shift_rows_up(self, removed_row):
-        new_cells = {}
-        for (c, r), val in self._cells.items():
-            if r < removed_row:
-                new_cells[(c, r)] = val
-            elif r > removed_row:
-                new_cells[(c, r - 1)] = val
-        self._cells = new_cells
+    @staticmethod
+    def split_commands_by_sheet(commands, sheet_ids):
+        """Reparte ``commands`` por ``sheetId`` en UNA pasada (aplana las
+        listas anidadas). Los comandos sin sheetId van a todas las hojas,
+        conservando el orden relativo, igual que en apply_revision_commands.
+        """
+        by_sheet = {sheet_id: [] for sheet_id in sheet_ids}
+        stack = [iter(commands)]
+        while stack:
+            for cmd in stack[-1]:
+                if isinstance(cmd, list):
+                    stack.append(iter(cmd))
+                    break
+                if not isinstance(cmd, dict):
+                    continue
+                sheet_id = cmd.get("sheetId")
+                if sheet_id:
+                    if sheet_id in by_sheet:
+                        by_sheet[sheet_id].append(cmd)
+                else:
+                    for sheet_cmds in by_sheet.values():
+                        sheet_cmds.append(cmd)
+            else:
+                stack.pop()
+        return by_sheet
+
+    def to_triplets(self):
+        """Celdas como ``[[col, row, contenido], ...]`` (0-based): formato
+        compacto para persistir el estado sin pasar por claves A1."""
+        return [[c, r, v] for (c, r), v in self._cells.items()]
+
+    @classmethod
+    def from_triplets(cls, triplets):
+        idx = cls()
+        idx._cells = {(int(c), int(r)): v for c, r, v in triplets or []}
+        return idx
 
     def value(self, col, row):
         return self._cells.get((int(col), int(row)))
@@ -135,6 +165,93 @@ class _PLCellsIndex:
         return max((r for (_c, r) in self._cells), default=-1)
 
 
+class _LotGroupResolver:
+    """Resolución nombre → id de ``stock.lot.group`` para una importación.
+
+    Compartida por los wizards de PL y WS: junta los nombres distintos y los
+    resuelve con UN search ``name in`` y, para los faltantes, UN
+    create(vals_list). Antes cada fila con grupo hacía su propio search (y
+    muchas veces un create).
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self._ids = {}
+        self._searched = set()
+
+    @staticmethod
+    def _clean(names):
+        return {str(n).strip() for n in names or [] if n and str(n).strip()}
+
+    def prefetch(self, names):
+        """Carga de una vez los grupos EXISTENTES de ``names`` (no crea)."""
+        pending = self._clean(names) - self._searched
+        if pending:
+            groups = self.env["stock.lot.group"].search([("name", "in", list(pending))])
+            for grp in groups:
+                # Con nombres duplicados gana el primero, como el limit=1 previo.
+                self._ids.setdefault(grp.name, grp.id)
+            self._searched |= pending
+        return self
+
+    def resolve(self, names):
+        """Mapa nombre → id para ``names``, creando en bloque los que falten."""
+        wanted = self._clean(names)
+        self.prefetch(wanted)
+        missing = sorted(n for n in wanted if n not in self._ids)
+        if missing:
+            created = self.env["stock.lot.group"].create([{"name": n} for n in missing])
+            for grp in created:
+                self._ids[grp.name] = grp.id
+            _logger.info("[PL_IMPORT] Grupos creados: %s", missing)
+        return {n: self._ids[n] for n in wanted}
+
+
+class _PLImportContext:
+    """Índices de UNA corrida de importación del PL.
+
+    Se arman una sola vez por importación: producto → move, contenedor →
+    prefijo/consecutivo de lote y nombre de grupo → id de stock.lot.group
+    (vía ``_LotGroupResolver``).
+    El ciclo de filas solo hace búsquedas en diccionario (antes cada fila
+    recorría move_ids con filtered(), cuadrático en pickings multi-producto).
+    """
+
+    def __init__(self, wizard):
+        self.wizard = wizard
+        self.env = wizard.env
+        self.moves_by_product = {}
+        for move in wizard.picking_id.move_ids:
+            # Primer move por producto, igual que el filtered()[:1] previo.
+            self.moves_by_product.setdefault(move.product_id.id, move)
+        self.containers = {}
+        self.next_prefix = None
+        self.groups = _LotGroupResolver(self.env)
+
+    def move_for(self, product):
+        return self.moves_by_product.get(product.id)
+
+    def next_lot_name(self, cont):
+        """Siguiente nombre de lote del contenedor ``cont`` (S<n>-<nn>)."""
+        if cont not in self.containers:
+            if self.next_prefix is None:
+                self.next_prefix = self.wizard._get_next_global_prefix()
+            # Serie "S": los lotes de recepciones nuevas nacen S1-01,
+            # S1-02… (S2-… el siguiente contenedor). La numeración S es
+            # independiente de la serie numérica histórica (15-01…).
+            prefix_str = "S%s" % self.next_prefix
+            self.containers[cont] = {
+                "pre": prefix_str,
+                "num": self.wizard._get_next_lot_number_for_prefix(prefix_str),
+            }
+            self.next_prefix += 1
+
+        entry = self.containers[cont]
+        name = f"{entry['pre']}-{entry['num']:02d}"
+        entry["num"] += 1
+        return name
+
+
 class PackingListImportWizard(models.TransientModel):
     _name = "packing.list.import.wizard"
     _description = "Importar Packing List"
@@ -260,18 +377,28 @@ class PackingListImportWizard(models.TransientModel):
                     _logger.warning("[PL_CLEANUP] No se pudo borrar lote %s: %s", lot.name, e)
 
         # --- CREACIÓN DE NUEVOS REGISTROS ---
-        move_lines_created = 0
+        # Primero se arman TODOS los valores (lote y move line por fila) y
+        # después se crean en bloque con create(vals_list): un create por
+        # fila disparaba miles de INSERT + recómputos en PLs de 500+ placas.
+        # La move line apunta a su lote por POSICIÓN (mismo índice en ambas
+        # listas); el id se resuelve al crear los lotes.
         skipped_without_move = 0
         skipped_qty_zero = 0
-        next_prefix = self._get_next_global_prefix()
-        containers = {}
+        ctx = _PLImportContext(self)
 
+        lot_vals_list = []
+        ml_vals_list = []
+        lot_group_names = []
         # Mapa para vincular imágenes después: key=(product_id, grosor, alto, ancho) → lot
         lot_creation_map = []
 
+        company_id = self.picking_id.company_id.id
+        location_id = self.picking_id.location_id.id
+        location_dest_id = self.picking_id.location_dest_id.id
+
         for data in rows:
             product = data["product"]
-            move = self.picking_id.move_ids.filtered(lambda m: m.product_id == product)[:1]
+            move = ctx.move_for(product)
 
             if not move:
                 skipped_without_move += 1
@@ -310,34 +437,16 @@ class PackingListImportWizard(models.TransientModel):
                 continue
 
             cont = (data.get("contenedor") or "SN").strip() or "SN"
+            l_name = ctx.next_lot_name(cont)
 
-            if cont not in containers:
-                # Serie "S": los lotes de recepciones nuevas nacen S1-01,
-                # S1-02… (S2-… el siguiente contenedor). La numeración S es
-                # independiente de la serie numérica histórica (15-01…).
-                prefix_str = "S%s" % next_prefix
-                containers[cont] = {
-                    "pre": prefix_str,
-                    "num": self._get_next_lot_number_for_prefix(prefix_str),
-                }
-                next_prefix += 1
-
-            l_name = f"{containers[cont]['pre']}-{containers[cont]['num']:02d}"
-
-            grupo_ids = []
-            if data.get("grupo_name"):
-                grupo_name = data["grupo_name"].strip()
-                grupo = self.env["stock.lot.group"].search([("name", "=", grupo_name)], limit=1)
-                if not grupo:
-                    grupo = self.env["stock.lot.group"].create({"name": grupo_name})
-                grupo_ids = [grupo.id]
+            lot_group_names.append((data.get("grupo_name") or "").strip())
 
             lot_selection_value = str(unit_type).lower()
 
-            lot = self.env["stock.lot"].create({
+            lot_vals_list.append({
                 "name": l_name,
                 "product_id": product.id,
-                "company_id": self.picking_id.company_id.id,
+                "company_id": company_id,
                 "x_grosor": data.get("grosor"),
                 "x_alto": final_alto,
                 "x_ancho": final_ancho,
@@ -346,14 +455,13 @@ class PackingListImportWizard(models.TransientModel):
                 "x_numero_placa": data.get("numero_placa"),
                 "x_atado": data.get("atado"),
                 "x_tipo": lot_selection_value,
-                "x_grupo": [(6, 0, grupo_ids)],
                 "x_pedimento": data.get("pedimento"),
                 "x_contenedor": cont,
                 "x_referencia_proveedor": data.get("ref_proveedor"),
             })
 
             lot_creation_map.append({
-                'lot': lot,
+                'lot': None,
                 'product_id': product.id,
                 'grosor': data.get("grosor", ""),
                 'alto': final_alto,
@@ -363,13 +471,12 @@ class PackingListImportWizard(models.TransientModel):
                 'tipo': unit_type,
             })
 
-            self.env["stock.move.line"].create({
+            ml_vals_list.append({
                 "move_id": move.id,
                 "product_id": product.id,
-                "lot_id": lot.id,
-                self._pl_ml_qty_key(): qty_done,
-                "location_id": self.picking_id.location_id.id,
-                "location_dest_id": self.picking_id.location_dest_id.id,
+                qty_key: qty_done,
+                "location_id": location_id,
+                "location_dest_id": location_dest_id,
                 "picking_id": self.picking_id.id,
                 "x_grosor_temp": data.get("grosor"),
                 "x_alto_temp": final_alto,
@@ -381,11 +488,21 @@ class PackingListImportWizard(models.TransientModel):
                 "x_pedimento_temp": data.get("pedimento"),
                 "x_contenedor_temp": cont,
                 "x_referencia_proveedor_temp": data.get("ref_proveedor"),
-                "x_grupo_temp": [(6, 0, grupo_ids)],
             })
 
-            containers[cont]["num"] += 1
-            move_lines_created += 1
+        # Grupos: todos los nombres del PL en un search + un create.
+        group_map = ctx.groups.resolve(lot_group_names)
+        for position, grupo_name in enumerate(lot_group_names):
+            grupo_ids = [group_map[grupo_name]] if grupo_name else []
+            lot_vals_list[position]["x_grupo"] = [(6, 0, grupo_ids)]
+            ml_vals_list[position]["x_grupo_temp"] = [(6, 0, grupo_ids)]
+
+        lots = self._pl_create_in_chunks("stock.lot", lot_vals_list)
+        for position, lot in enumerate(lots):
+            ml_vals_list[position]["lot_id"] = lot.id
+            lot_creation_map[position]["lot"] = lot
+        move_lines = self._pl_create_in_chunks("stock.move.line", ml_vals_list)
+        move_lines_created = len(move_lines)
 
         # --- SINCRONIZACIÓN WORKSHEET ---
         if self.picking_id.ws_spreadsheet_id:
@@ -427,6 +544,22 @@ class PackingListImportWizard(models.TransientModel):
             },
         }
 
+    def _pl_create_in_chunks(self, model_name, vals_list):
+        """Crea ``vals_list`` en bloques de ``_PL_CREATE_CHUNK`` con
+        create(vals_list). Devuelve el recordset en el MISMO orden que los
+        valores recibidos (las move lines dependen de esa posición)."""
+        Model = self.env[model_name]
+        records = Model.browse()
+        for start in range(0, len(vals_list), _PL_CREATE_CHUNK):
+            records |= Model.create(vals_list[start:start + _PL_CREATE_CHUNK])
+        _logger.info(
+            "[PL_IMPORT] %s: %s registros creados en %s bloque(s).",
+            model_name,
+            len(records),
+            -(-len(vals_list) // _PL_CREATE_CHUNK),
+        )
+        return records
+
     # =========================================================================
     #  VINCULACIÓN DE FOTOGRAFÍAS DEL PORTAL → stock.lot.image
     # =========================================================================
@@ -626,29 +759,39 @@ class PackingListImportWizard(models.TransientModel):
             bool(doc.spreadsheet_data),
         )
 
-        spreadsheet_json = self._get_current_spreadsheet_state(doc)
-        if not spreadsheet_json or not spreadsheet_json.get("sheets"):
-            _logger.warning("[PL_DEBUG] spreadsheet_json vacío o sin sheets")
+        sheet_indexes = self._get_current_sheet_indexes(doc)
+        if not sheet_indexes:
+            _logger.warning("[PL_DEBUG] spreadsheet vacío o sin sheets")
             return []
 
         _logger.info(
             "[PL_DEBUG] Sheets encontrados: %s",
-            [s.get("name") for s in spreadsheet_json.get("sheets", [])],
+            [sheet.get("name") for sheet, _idx in sheet_indexes],
         )
 
         all_rows = []
         products_not_found = []
-
-        for sheet in spreadsheet_json["sheets"]:
-            idx = _PLCellsIndex()
-            idx.ingest_cells(sheet.get("cells", {}))
+        # Primero por id determinista de hoja; las cabeceras restantes se
+        # resuelven juntas en una sola pasada del resolvedor.
+        sheet_products = [
+            (sheet, idx, self._resolve_product_from_sheet_id(sheet))
+            for sheet, idx in sheet_indexes
+        ]
+        resolver = self.picking_id._sheet_product_resolver()
+        resolver.prefetch([
+            self._sheet_header_value(idx)
+            for _sheet, idx, product in sheet_products
+            if not product
+        ])
+
+        for sheet, idx, product in sheet_products:
             _logger.info(
-                "[PL_DEBUG] Sheet '%s': %s celdas tras ingest",
+                "[PL_DEBUG] Sheet '%s': %s celdas",
                 sheet.get("name"),
                 len(idx._cells),
             )
 
-            product = self._resolve_product_from_sheet_id(sheet) or self._identify_product_from_sheet(idx)
+            product = product or self._identify_product_from_sheet(idx, resolver)
             _logger.info(
                 "[PL_DEBUG] Producto identificado en hoja '%s': %s",
                 sheet.get("name"),
@@ -675,7 +818,16 @@ class PackingListImportWizard(models.TransientModel):
 
         return all_rows
 
-    def _get_current_spreadsheet_state(self, doc):
+    def _get_current_sheet_indexes(self, doc):
+        """Estado actual del spreadsheet como ``[(hoja, _PLCellsIndex)]``:
+        base (snapshot o spreadsheet_data) más las revisiones pendientes.
+
+        Los índices salen listos para los extractores de filas (sin volver a
+        serializar a claves A1 ni re-parsearlas). El estado se materializa en
+        ``documents.document`` junto con el id de la última revisión
+        aplicada: las llamadas siguientes parten de ese estado y reproducen
+        SOLO las revisiones nuevas, sin parsear la base.
+        """
         snapshot_len = len(doc.spreadsheet_snapshot) if doc.spreadsheet_snapshot else 0
         data_len = len(doc.spreadsheet_data) if doc.spreadsheet_data else 0
 
@@ -690,18 +842,90 @@ class PackingListImportWizard(models.TransientModel):
             data_len,
         )
 
+        doc_sudo = doc.sudo()
+        raw = doc.spreadsheet_snapshot or doc.spreadsheet_data
+        cached = doc_sudo._som_state_cache_get("pl_sheets", raw) if raw else None
+        if not cached:
+            base = self._get_spreadsheet_base(doc)
+            if not base:
+                return []
+            raw, spreadsheet_json, start_after = base
+            if start_after is not False:
+                cached = doc_sudo._som_state_cache_get("pl_sheets", raw)
+
+        last_rev_id = 0
+        if cached:
+            start_after = cached.get("wait_for")
+            last_rev_id = cached["rev_id"]
+            sheet_indexes = [
+                ({"id": sheet.get("id"), "name": sheet.get("name")},
+                 _PLCellsIndex.from_triplets(sheet.get("cells")))
+                for sheet in cached.get("sheets", [])
+            ]
+            _logger.info(
+                "[PL_DEBUG] Estado de celdas en caché hasta revisión %s", last_rev_id,
+            )
+        else:
+            sheet_indexes = []
+            for sheet in spreadsheet_json.get("sheets", []):
+                idx = _PLCellsIndex()
+                idx.ingest_cells(sheet.get("cells", {}))
+                sheet_indexes.append(({"id": sheet.get("id"), "name": sheet.get("name")}, idx))
+
+        if start_after is False:
+            _logger.info("[PL_DEBUG] Sin revisionId en snapshot, se usa tal cual")
+            if not cached:
+                self._store_sheet_indexes(doc_sudo, raw, 0, False, sheet_indexes)
+            return sheet_indexes
+
+        revisions = doc_sudo._som_spreadsheet_revisions(after_id=last_rev_id)
+        _logger.info("[PL_DEBUG] Revisiones nuevas en BD: %s", len(revisions))
+        if not revisions:
+            # Sin revisiones también se guarda (rev_id 0): la siguiente
+            # lectura no vuelve a parsear la base.
+            if not cached:
+                self._store_sheet_indexes(doc_sudo, raw, 0, start_after, sheet_indexes)
+            return sheet_indexes
+
+        all_cmds, started = self._collect_revision_commands(revisions, start_after)
+        _logger.info(
+            "[PL_DEBUG] Comandos pendientes a aplicar: %s", len(all_cmds),
+        )
+        if all_cmds:
+            self._replay_commands_on_sheets(sheet_indexes, all_cmds)
+
+        self._store_sheet_indexes(
+            doc_sudo, raw, revisions[-1].id, None if started else start_after, sheet_indexes,
+        )
+        return sheet_indexes
+
+    def _store_sheet_indexes(self, doc_sudo, raw, last_rev_id, wait_for, sheet_indexes):
+        doc_sudo._som_state_cache_put("pl_sheets", raw, last_rev_id, {
+            "wait_for": wait_for,
+            "sheets": [
+                {"id": sheet.get("id"), "name": sheet.get("name"), "cells": idx.to_triplets()}
+                for sheet, idx in sheet_indexes
+            ],
+        })
+
+    def _get_spreadsheet_base(self, doc):
+        """Base del estado: ``(raw, json, start_after)``.
+
+        ``start_after`` es el revisionId del snapshot (las revisiones se
+        aplican a partir de él), ``False`` para un snapshot sin revisionId
+        (se usa tal cual) o ``None`` para spreadsheet_data (se aplican todas).
+        """
         if doc.spreadsheet_snapshot:
             try:
                 parsed = self._safe_json_load(doc.spreadsheet_snapshot)
                 if parsed:
-                    sheets_count = len(parsed.get("sheets", []))
                     _logger.info(
                         "[PL_DEBUG] snapshot parseado OK | sheets: %s | revisionId: %s",
-                        sheets_count,
+                        len(parsed.get("sheets", [])),
                         parsed.get("revisionId", "N/A"),
                     )
                     if parsed.get("sheets"):
-                        return self._apply_pending_revisions(doc, parsed)
+                        return doc.spreadsheet_snapshot, parsed, parsed.get("revisionId") or False
             except Exception as e:
                 _logger.warning("[PL_IMPORT] Error leyendo snapshot: %s", e)
 
@@ -715,31 +939,26 @@ class PackingListImportWizard(models.TransientModel):
                 if snapshot_data:
                     parsed = self._safe_json_load(snapshot_data)
                     if parsed and parsed.get("sheets"):
-                        return self._apply_pending_revisions(doc, parsed)
+                        return snapshot_data, parsed, parsed.get("revisionId") or False
         except Exception as e:
             _logger.warning("[PL_IMPORT] Error en _get_spreadsheet_serialized_snapshot: %s", e)
 
         _logger.info("[PL_IMPORT] Fallback: spreadsheet_data + todas las revisiones")
-        return self._load_spreadsheet_with_all_revisions(doc)
-
-    def _apply_pending_revisions(self, doc, spreadsheet_json):
-        snapshot_revision_id = spreadsheet_json.get("revisionId", "")
+        spreadsheet_json = self._load_spreadsheet_json(doc)
         _logger.info(
-            "[PL_DEBUG] _apply_pending_revisions | revisionId snapshot: '%s'",
-            snapshot_revision_id,
+            "[PL_DEBUG] _load_spreadsheet_json: %s | sheets: %s",
+            bool(spreadsheet_json),
+            len(spreadsheet_json.get("sheets", [])) if spreadsheet_json else 0,
         )
+        if not spreadsheet_json:
+            return None
+        return doc.spreadsheet_data, spreadsheet_json, None
 
-        if not snapshot_revision_id:
-            _logger.info("[PL_DEBUG] Sin revisionId en snapshot, retornando json tal cual")
-            return spreadsheet_json
-
-        revisions = self.env["spreadsheet.revision"].sudo().with_context(active_test=False).search([
-            ("res_model", "=", "documents.document"),
-            ("res_id", "=", doc.id),
-        ], order="id asc")
-        _logger.info("[PL_DEBUG] Revisiones totales en BD: %s", len(revisions))
-
-        start_applying = False
+    def _collect_revision_commands(self, revisions, start_after=None):
+        """Aplana los comandos de ``revisions``. Con ``start_after`` se
+        descartan las revisiones hasta la que tiene ese id (ya incluidas en
+        el snapshot). Devuelve ``(comandos, ya_se_alcanzó_start_after)``."""
+        start_applying = not start_after
         all_cmds = []
 
         for rev in revisions:
@@ -749,7 +968,7 @@ class PackingListImportWizard(models.TransientModel):
 
             if not start_applying:
                 rev_id = rev_data.get("id") if isinstance(rev_data, dict) else None
-                if rev_id == snapshot_revision_id:
+                if rev_id == start_after:
                     start_applying = True
                 continue
 
@@ -761,93 +980,29 @@ class PackingListImportWizard(models.TransientModel):
             elif isinstance(rev_data, list):
                 all_cmds.extend(rev_data)
 
-        _logger.info(
-            "[PL_DEBUG] Comandos pendientes a aplicar tras snapshot: %s",
-            len(all_cmds),
-        )
+        return all_cmds, start_applying
 
-        if not all_cmds:
-            _logger.info("[PL_DEBUG] Sin comandos pendientes, retornando snapshot directo")
-            return spreadsheet_json
-
-        for sheet in spreadsheet_json.get("sheets", []):
-            sheet_id = sheet.get("id")
-            idx = _PLCellsIndex()
-            cells_before = len(sheet.get("cells", {}))
-            idx.ingest_cells(sheet.get("cells", {}))
-            applied = idx.apply_revision_commands(all_cmds, sheet_id)
-
-            _logger.info(
-                "[PL_DEBUG] Sheet '%s' | celdas antes: %s | cmds aplicados: %s | celdas después: %s",
-                sheet.get("name"),
-                cells_before,
-                applied,
-                len(idx._cells),
-            )
-
-            sheet["cells"] = {
-                f"{self._col_to_letter(c)}{r + 1}": {"content": v}
-                for (c, r), v in idx._cells.items()
-            }
-
-        return spreadsheet_json
-
-    def _load_spreadsheet_with_all_revisions(self, doc):
-        spreadsheet_json = self._load_spreadsheet_json(doc)
-        _logger.info(
-            "[PL_DEBUG] _load_spreadsheet_json: %s | sheets: %s",
-            bool(spreadsheet_json),
-            len(spreadsheet_json.get("sheets", [])) if spreadsheet_json else 0,
+    def _replay_commands_on_sheets(self, sheet_indexes, all_cmds):
+        # Un solo recorrido de los comandos: cada hoja recibe SOLO los suyos
+        # (antes cada hoja barría la lista completa saltando los ajenos).
+        cmds_by_sheet = _PLCellsIndex.split_commands_by_sheet(
+            all_cmds, [sheet.get("id") for sheet, _idx in sheet_indexes]
         )
-
-        if not spreadsheet_json:
-            return None
-
-        revisions = self.env["spreadsheet.revision"].sudo().with_context(active_test=False).search([
-            ("res_model", "=", "documents.document"),
-            ("res_id", "=", doc.id),
-        ], order="id asc")
-        _logger.info("[PL_DEBUG] Revisiones en fallback: %s", len(revisions))
-
-        all_cmds = []
-        for rev in revisions:
-            rev_data = self._safe_json_load(rev.commands)
-            if not rev_data:
-                continue
-
-            if isinstance(rev_data, dict) and rev_data.get("type") == "SNAPSHOT_CREATED":
-                continue
-
-            if isinstance(rev_data, dict) and "commands" in rev_data:
-                all_cmds.extend(rev_data["commands"])
-            elif isinstance(rev_data, list):
-                all_cmds.extend(rev_data)
-
-        _logger.info("[PL_DEBUG] Comandos totales en fallback: %s", len(all_cmds))
-
-        for sheet in spreadsheet_json.get("sheets", []):
-            idx = _PLCellsIndex()
-            cells_before = len(sheet.get("cells", {}))
-            idx.ingest_cells(sheet.get("cells", {}))
-            applied = idx.apply_revision_commands(all_cmds, sheet.get("id"))
+        for sheet, idx in sheet_indexes:
+            cells_before = len(idx._cells)
+            applied = idx.apply_revision_commands(
+                cmds_by_sheet.get(sheet.get("id"), []), sheet.get("id")
+            )
 
             _logger.info(
-                "[PL_DEBUG] Fallback sheet '%s' | celdas antes: %s | cmds: %s | celdas después: %s",
+                "[PL_DEBUG] Sheet '%s' | celdas antes: %s | cmds aplicados: %s | celdas después: %s",
                 sheet.get("name"),
                 cells_before,
                 applied,
                 len(idx._cells),
             )
 
-            sample = list(idx._cells.items())[:10]
-            _logger.info("[PL_DEBUG] Muestra celdas: %s", sample)
-
-            sheet["cells"] = {
-                f"{self._col_to_letter(c)}{r + 1}": {"content": v}
-                for (c, r), v in idx._cells.items()
-            }
-
-        return spreadsheet_json
+        return sheet_indexes
 
     def _safe_json_load(self, payload):
         if not payload:
@@ -870,80 +1025,17 @@ class PackingListImportWizard(models.TransientModel):
 
         return None
 
-    def _col_to_letter(self, col):
-        result = ""
-        col += 1
-        while col:
-            col, remainder = divmod(col - 1, 26)
-            result = chr(65 + remainder) + result
-        return result
-
-    def _normalize_product_text(self, text):
-        if not text:
-            return ""
-
-        text = str(text).strip()
-        text = re.sub(r"\(\s*\)", "", text)
-        text = re.sub(r"\s+", " ", text)
-        return text.strip()
-
-    def _extract_short_product_name(self, text):
-        if not text:
-            return ""
-
-        short_name = str(text).split("(")[0].strip()
-        short_name = re.sub(r"\s+", " ", short_name)
-        return short_name.strip()
-
-    def _find_product_by_header(self, raw_product_value):
-        Product = self.env["product.product"]
-
-        raw_name = str(raw_product_value or "").strip()
-        clean_name = self._normalize_product_text(raw_name)
-        short_name = self._extract_short_product_name(clean_name)
-
-        _logger.info(
-            "[PL_DEBUG] Buscando producto | raw='%s' | clean='%s' | short='%s'",
-            raw_name,
-            clean_name,
-            short_name,
-        )
-
-        search_attempts = []
-
-        if clean_name:
-            search_attempts.extend([
-                ("name", "=", clean_name, "name exacto clean"),
-                ("default_code", "=", clean_name, "default_code exacto clean"),
-                ("name", "ilike", clean_name, "name ilike clean"),
-                ("default_code", "ilike", clean_name, "default_code ilike clean"),
-            ])
-
-        if short_name and short_name != clean_name:
-            search_attempts.extend([
-                ("name", "=", short_name, "name exacto short"),
-                ("default_code", "=", short_name, "default_code exacto short"),
-                ("name", "ilike", short_name, "name ilike short"),
-                ("default_code", "ilike", short_name, "default_code ilike short"),
-            ])
-
-        for field_name, operator, value, label in search_attempts:
-            product = Product.search([(field_name, operator, value)], limit=1)
-            if product:
-                _logger.info(
-                    "[PL_DEBUG] Producto encontrado por %s: %s",
-                    label,
-                    product.display_name,
-                )
-                return product
-
-        _logger.warning(
-            "[PL_DEBUG] No se encontró producto para raw='%s' | clean='%s' | short='%s'",
-            raw_name,
-            clean_name,
-            short_name,
-        )
-        return None
+    def _find_product_by_header(self, raw_product_value, resolver=None):
+        """Producto de la cabecera B1 de una hoja. ``resolver`` se comparte
+        entre hojas para resolver cada cabecera una sola vez y contra los
+        productos del picking antes de ir a la base."""
+        resolver = resolver or self.picking_id._sheet_product_resolver()
+        product = resolver.resolve(raw_product_value)
+        if product:
+            _logger.info("[PL_DEBUG] Producto encontrado: %s", product.display_name)
+        else:
+            _logger.warning("[PL_DEBUG] No se encontró producto para '%s'", raw_product_value)
+        return product
 
     def _resolve_product_from_sheet_id(self, sheet):
         """Resuelve el producto desde el id determinista de la hoja
@@ -960,25 +1052,26 @@ class PackingListImportWizard(models.TransientModel):
         product = self.env["product.product"].browse(int(match.group(1)))
         return product if product.exists() else None
 
-    def _identify_product_from_sheet(self, idx):
+    def _sheet_header_value(self, idx):
+        """Texto de producto de la cabecera: la celda B junto a 'PRODUCTO:'
+        en las tres primeras filas o, en su defecto, B1."""
         p_info = None
-
         for r in range(3):
             label = str(idx.value(0, r) or "").upper().strip()
-            val_b = idx.value(1, r)
-            _logger.info("[PL_DEBUG] identify fila %s: A='%s' B='%s'", r, label, val_b)
             if "PRODUCTO:" in label:
-                p_info = val_b
+                p_info = idx.value(1, r)
                 break
+        return p_info or idx.value(1, 0)
 
-        if not p_info:
-            p_info = idx.value(1, 0)
+    def _identify_product_from_sheet(self, idx, resolver=None):
+        p_info = self._sheet_header_value(idx)
+        _logger.info("[PL_DEBUG] identify cabecera: '%s'", p_info)
 
         if not p_info:
             _logger.warning("[PL_DEBUG] No se encontró info de producto en la hoja")
             return None
 
-        return self._find_product_by_header(p_info)
+        return self._find_product_by_header(p_info, resolver)
 
     def _extract_rows_from_index(self, idx, product):
         rows = []
@@ -1137,38 +1230,27 @@ class PackingListImportWizard(models.TransientModel):
             return None
 
     def _get_data_from_excel_file(self):
-        from openpyxl import load_workbook
-
-        wb = load_workbook(io.BytesIO(base64.b64decode(self.excel_file)), data_only=True)
         rows = []
+        resolver = self.picking_id._sheet_product_resolver()
 
-        for sheet in wb.worksheets:
-            p_info = sheet["B1"].value
+        for title, p_info, sheet_rows in pl_template.iter_excel_sheets(self.excel_file):
             if not p_info:
-                _logger.warning("[PL_DEBUG][XLSX] Hoja '%s' sin encabezado de producto en B1", sheet.title)
+                _logger.warning("[PL_DEBUG][XLSX] Hoja '%s' sin encabezado de producto en B1", title)
                 continue
 
-            product = self._find_product_by_header(p_info)
+            product = self._find_product_by_header(p_info, resolver)
             if not product:
                 _logger.warning(
                     "[PL_DEBUG][XLSX] No se encontró producto para hoja '%s' con encabezado '%s'",
-                    sheet.title,
+                    title,
                     p_info,
                 )
                 continue
 
             unit_type = str(product.product_tmpl_id.x_unidad_del_producto or "Placa").strip().capitalize()
 
+            # Índices 0-based dentro de la tupla de la fila (col. E = 4…).
             if unit_type == "Placa":
-                col_notas = 5
-                col_bloque = 6
-                col_placa = 7
-                col_atado = 8
-                col_grupo = 9
-                col_pedimento = 10
-                col_contenedor = 11
-                col_ref = 12
-            else:
                 col_notas = 4
                 col_bloque = 5
                 col_placa = 6
@@ -1177,11 +1259,23 @@ class PackingListImportWizard(models.TransientModel):
                 col_pedimento = 9
                 col_contenedor = 10
                 col_ref = 11
-
-            for r in range(4, sheet.max_row + 1):
-                raw_a = sheet.cell(r, 1).value
-                raw_b = sheet.cell(r, 2).value
-                raw_c = sheet.cell(r, 3).value
+            else:
+                col_notas = 3
+                col_bloque = 4
+                col_placa = 5
+                col_atado = 6
+                col_grupo = 7
+                col_pedimento = 8
+                col_contenedor = 9
+                col_ref = 10
+
+            for values in sheet_rows:
+                def cell(i):
+                    return values[i] if i < len(values) else None
+
+                raw_a = cell(0)
+                raw_b = cell(1)
+                raw_c = cell(2)
 
                 val_a = self._to_float(raw_a)
                 val_b = self._to_float(raw_b)
@@ -1204,16 +1298,16 @@ class PackingListImportWizard(models.TransientModel):
                         "alto": val_b if unit_type == "Placa" else 0.0,
                         "ancho": val_a if unit_type == "Placa" else 0.0,
                         "quantity": val_b if unit_type != "Placa" else 0.0,
-                        "color": str(sheet.cell(r, col_notas).value or "").strip(),
-                        "bloque": str(sheet.cell(r, col_bloque).value or "").strip(),
-                        "numero_placa": str(sheet.cell(r, col_placa).value or "").strip(),
-                        "atado": str(sheet.cell(r, col_atado).value or "").strip(),
+                        "color": str(cell(col_notas) or "").strip(),
+                        "bloque": str(cell(col_bloque) or "").strip(),
+                        "numero_placa": str(cell(col_placa) or "").strip(),
+                        "atado": str(cell(col_atado) or "").strip(),
                         "tipo": unit_type,
-                        "grupo_name": str(sheet.cell(r, col_grupo).value or "").strip(),
-                        "pedimento": str(sheet.cell(r, col_pedimento).value or "").strip(),
-                        "contenedor": str(sheet.cell(r, col_contenedor).value or "SN").strip(),
-                        "ref_proveedor": str(sheet.cell(r, col_ref).value or "").strip(),
+                        "grupo_name": str(cell(col_grupo) or "").strip(),
+                        "pedimento": str(cell(col_pedimento) or "").strip(),
+                        "contenedor": str(cell(col_contenedor) or "SN").strip(),
+                        "ref_proveedor": str(cell(col_ref) or "").strip(),
                     })
 
         _logger.info("[PL_DEBUG][XLSX] Total filas extraídas desde Excel: %s", len(rows))
-        return rows
\ No newline at end of file
+        return rows
@@ -1,11 +1,12 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
-import base64
-import io
 import json
 import logging
 
+from ..models import pl_template
+from .packing_list_import_wizard import _LotGroupResolver, _PLCellsIndex
+
 _logger = logging.getLogger(__name__)
 
 class WorksheetImportWizard(models.TransientModel):
@@ -248,6 +249,10 @@ class WorksheetImportWizard(models.TransientModel):
         lots_to_delete = []
         move_lines_to_delete = []
 
+        # Grupos del WS: se juntan (lote, nombres) en el recorrido y al final
+        # se resuelven TODOS los nombres con un search y un create en bloque.
+        group_updates = {}
+
         for data in rows_data:
             product = data['product']
             lot_name = data['lot_name']
@@ -285,17 +290,10 @@ class WorksheetImportWizard(models.TransientModel):
                 current_names = set(lot.x_grupo.mapped('name')) if lot.x_grupo else set()
                 wanted = {g.strip() for g in ws_grupo.split(',') if g.strip()}
                 if wanted and wanted != current_names:
-                    Group = self.env['stock.lot.group']
-                    gids = []
-                    for gname in wanted:
-                        grp = Group.search([('name', '=', gname)], limit=1)
-                        if not grp:
-                            grp = Group.create({'name': gname})
-                        gids.append(grp.id)
                     _logger.info(
                         "[WS_IMPORT] Lote %s: grupo %s -> %s",
                         lot.name, sorted(current_names), sorted(wanted))
-                    lot.write({'x_grupo': [(6, 0, gids)]})
+                    group_updates[lot.id] = (lot, frozenset(wanted))
 
             # Formatos: el WS solo corrobora cantidad real contra teórica.
             # No hay alto/largo real y no se renumeran lotes por contenedor.
@@ -343,6 +341,17 @@ class WorksheetImportWizard(models.TransientModel):
                 })
                 lines_updated += 1
 
+        if group_updates:
+            group_ids = _LotGroupResolver(self.env).resolve(
+                name for _lot, wanted in group_updates.values() for name in wanted
+            )
+            lots_by_groups = {}
+            for lot, wanted in group_updates.values():
+                lots_by_groups.setdefault(wanted, self.env['stock.lot'])
+                lots_by_groups[wanted] |= lot
+            for wanted, lots in lots_by_groups.items():
+                lots.write({'x_grupo': [(6, 0, [group_ids[name] for name in wanted])]})
+
         # PARCIALIDAD, NO DESTRUCCIÓN: una fila en 0 significa "no llegó
         # EN ESTA recepción". Antes este bloque borraba move lines, PONÍA
         # EN CERO Y ELIMINABA los quants de tránsito y hasta los lotes —
@@ -450,14 +459,16 @@ class WorksheetImportWizard(models.TransientModel):
             data = pl_wizard._load_spreadsheet_json(doc)
         if not data: return []
 
-        from .packing_list_import_wizard import _PLCellsIndex
-
         all_rows = []
+        resolver = self.picking_id._sheet_product_resolver(data.get('sheets', []))
         for sheet in data.get('sheets', []):
             idx = _PLCellsIndex()
             idx.ingest_cells(sheet.get('cells', {}))
             
-            product = pl_wizard._resolve_product_from_sheet_id(sheet) or pl_wizard._identify_product_from_sheet(idx)
+            product = (
+                pl_wizard._resolve_product_from_sheet_id(sheet)
+                or pl_wizard._identify_product_from_sheet(idx, resolver)
+            )
             if not product: continue
             is_placa = self.picking_id._ws_product_is_placa(product)
 
@@ -505,27 +516,25 @@ class WorksheetImportWizard(models.TransientModel):
 
     def _get_data_from_excel(self):
         try:
-            from openpyxl import load_workbook
+            sheets = pl_template.iter_excel_sheets(self.excel_file)
         except ImportError:
             raise UserError('Instale openpyxl')
-            
-        wb = load_workbook(io.BytesIO(base64.b64decode(self.excel_file)), data_only=True)
+
         all_rows = []
-        
-        for sheet in wb.worksheets:
-            p_info = sheet['B1'].value
+        resolver = self.picking_id._sheet_product_resolver()
+
+        for _title, p_info, sheet_rows in sheets:
             if not p_info: continue
-            
-            p_code = str(p_info).split('(')[1].split(')')[0].strip() if '(' in str(p_info) else ''
-            product = self.env['product.product'].search([
-                '|', ('default_code', '=', p_code), ('name', '=', str(p_info).split('(')[0].strip())
-            ], limit=1)
-            
+
+            product = resolver.resolve(p_info)
             if not product: continue
             is_placa = self.picking_id._ws_product_is_placa(product)
 
-            for r in range(4, sheet.max_row + 1):
-                lot_name = str(sheet.cell(r, 1).value or '').strip()
+            for values in sheet_rows:
+                def cell(i):
+                    return values[i] if i < len(values) else None
+
+                lot_name = str(cell(0) or '').strip()
                 if not lot_name: continue
 
                 if is_placa:
@@ -534,10 +543,10 @@ class WorksheetImportWizard(models.TransientModel):
                         'product': product,
                         'lot_name': lot_name,
                         'is_placa': True,
-                        'ancho_real': self._to_float(sheet.cell(r, 15).value),
-                        'alto_real': self._to_float(sheet.cell(r, 16).value),
-                        'pedimento': str(sheet.cell(r, 11).value or '').strip(),
-                        'grupo_name': str(sheet.cell(r, 10).value or '').strip(),
+                        'ancho_real': self._to_float(cell(14)),
+                        'alto_real': self._to_float(cell(15)),
+                        'pedimento': str(cell(10) or '').strip(),
+                        'grupo_name': str(cell(9) or '').strip(),
                     })
                 else:
                     # Formatos: col 15 = CANT. REAL.
@@ -545,9 +554,9 @@ class WorksheetImportWizard(models.TransientModel):
                         'product': product,
                         'lot_name': lot_name,
                         'is_placa': False,
-                        'qty_real': self._to_float(sheet.cell(r, 15).value),
-                        'pedimento': str(sheet.cell(r, 11).value or '').strip(),
-                        'grupo_name': str(sheet.cell(r, 10).value or '').strip(),
+                        'qty_real': self._to_float(cell(14)),
+                        'pedimento': str(cell(10) or '').strip(),
+                        'grupo_name': str(cell(9) or '').strip(),
                     })
         return all_rows
 